@@ -0,0 +1,52 @@
+"""Gunicorn configuration of the production server.
+
+Run with `gunicorn -c api_config/gunicorn.conf.py`. Every setting is
+taken from a `GUNICORN_*` environment variable. The application is loaded
+once in the master before workers are forked, so they share its memory
+copy-on-write. `GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker`
+serves the ASGI application instead of the WSGI one.
+
+`kill -HUP <master>` restarts workers gracefully, with the preloaded
+application new code is deployed by `kill -USR2 <master>` followed by
+`kill -TERM <old master>` once the new one is up.
+"""
+
+import multiprocessing
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+if worker_class.startswith("uvicorn."):
+    wsgi_app = "api_config.asgi:application"
+else:
+    wsgi_app = "api_config.wsgi:application"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+)
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = True
+
+# seconds a silent worker lives, and a stopping one finishes its requests
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# workers are recycled after a jittered number of requests to bound leaks
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.environ.get("GUNICORN_ERROR_LOG", "-")
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def pre_fork(server, worker):
+    """Connections opened while preloading must not be shared by workers,
+    they are closed in the master before forking."""
+    from django.db import connections
+
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "app",
     "rest_framework.authtoken",
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "app.throttling.RateLimitHeadersMiddleware",
 ]
 
 ROOT_URLCONF = "api_config.urls"
@@ -91,9 +93,30 @@ DATABASES = {
         "PASSWORD": os.environ["POSTGRES_PASSWORD"],
         "HOST": os.environ["POSTGRES_HOST"],
         "PORT": os.environ["POSTGRES_PORT"],
+        # connections are reused for DB_CONN_MAX_AGE seconds and checked
+        # before reuse, 0 closes them at the end of every request
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+# psycopg 3 pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections per
+# process, replaces persistent connections (preferred under ASGI)
+if os.environ.get("DB_POOL", "False").lower() == "true":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+    }
+
+# behind PgBouncer in transaction mode the server session may change
+# between transactions, so cursors of `.iterator()` can not outlive them
+# (Django already disables prepared statements and server side binding)
+if os.environ.get("DB_PGBOUNCER", "False").lower() == "true":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -131,6 +154,61 @@ USE_TZ = True
 STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "/vol/web/media"
+
+# quality of WebP/JPEG renditions produced for uploaded images
+IMAGE_RENDITION_QUALITY = int(os.environ.get("IMAGE_RENDITION_QUALITY", 82))
+
+# resumable chunked uploads of post images
+CHUNKED_UPLOAD_DIR = os.environ.get("CHUNKED_UPLOAD_DIR", "/vol/web/uploads")
+CHUNKED_UPLOAD_MAX_SIZE = int(
+    os.environ.get("CHUNKED_UPLOAD_MAX_SIZE", 50 * 1024 * 1024)
+)
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = int(
+    os.environ.get("CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 * 1024)
+)
+CHUNKED_UPLOAD_EXPIRE = int(os.environ.get("CHUNKED_UPLOAD_EXPIRE", 86400))
+
+# posts claimed by one UPDATE of the scheduled publisher
+SCHEDULED_POSTS_BATCH_SIZE = int(
+    os.environ.get("SCHEDULED_POSTS_BATCH_SIZE", 1000)
+)
+
+# bulk post creation, POST_BULK_MAX_SIZE limits posts per API request
+POST_BULK_MAX_SIZE = int(os.environ.get("POST_BULK_MAX_SIZE", 1000))
+POST_BULK_BATCH_SIZE = int(os.environ.get("POST_BULK_BATCH_SIZE", 500))
+
+# seconds tokens stay valid (0 never expires), seconds users of tokens
+# stay in the shared cache and in the per process cache of up to
+# AUTH_TOKEN_LOCAL_SIZE tokens
+AUTH_TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", 0))
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get("AUTH_TOKEN_CACHE_TTL", 300))
+AUTH_TOKEN_LOCAL_TTL = int(os.environ.get("AUTH_TOKEN_LOCAL_TTL", 5))
+AUTH_TOKEN_LOCAL_SIZE = int(os.environ.get("AUTH_TOKEN_LOCAL_SIZE", 10000))
+
+# seconds follow graph sets stay in Redis after they were loaded
+GRAPH_CACHE_TTL = int(os.environ.get("GRAPH_CACHE_TTL", 86400))
+
+# follow suggestions kept per user, users scored at once, score added per
+# hashtag both users posted with and seconds the offline job may run
+SUGGESTIONS_SIZE = int(os.environ.get("SUGGESTIONS_SIZE", 20))
+SUGGESTIONS_BATCH_SIZE = int(os.environ.get("SUGGESTIONS_BATCH_SIZE", 1000))
+SUGGESTIONS_HASHTAG_WEIGHT = float(
+    os.environ.get("SUGGESTIONS_HASHTAG_WEIGHT", 0.1)
+)
+SUGGESTIONS_TIME_LIMIT = int(os.environ.get("SUGGESTIONS_TIME_LIMIT", 3600))
+
+# number of hashtags kept in every trending window
+TRENDING_SIZE = int(os.environ.get("TRENDING_SIZE", 1000))
+
+# hashtag autocomplete indexes prefixes up to HASHTAG_PREFIX_LENGTH
+# characters and keeps HASHTAG_AUTOCOMPLETE_SIZE hashtags per prefix
+HASHTAG_PREFIX_LENGTH = int(os.environ.get("HASHTAG_PREFIX_LENGTH", 10))
+HASHTAG_AUTOCOMPLETE_SIZE = int(
+    os.environ.get("HASHTAG_AUTOCOMPLETE_SIZE", 100)
+)
+
+# seconds an unreferenced picture is kept before it is garbage collected
+BLOB_GC_GRACE = int(os.environ.get("BLOB_GC_GRACE", 3600))
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -138,20 +216,44 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "app.User"
 
+# token bucket rates of throttle scopes, THROTTLE_RATE_<SCOPE>=num/period
+THROTTLE_RATES = {
+    scope: os.environ.get(f"THROTTLE_RATE_{scope.upper()}", rate)
+    for scope, rate in {
+        "login": "10/min",
+        "register": "10/hour",
+        "posts": "30/min",
+        "likes": "120/min",
+        "comments": "60/min",
+        "follows": "60/min",
+        "uploads": "20/min",
+        "upload_chunks": "600/min",
+    }.items()
+}
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "app.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "app.throttling.TokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": THROTTLE_RATES,
+    # anonymous clients are told apart by the address the last of
+    # NUM_PROXIES trusted proxies saw, X-Forwarded-For is ignored without
+    # proxies as clients can forge it
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
     "DEFAULT_PARSER_CLASSES": (
         "rest_framework.parsers.JSONParser",
         "rest_framework.parsers.MultiPartParser",
         "rest_framework.parsers.FormParser",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "app.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.environ.get("PAGE_SIZE", 20)),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -171,6 +273,76 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_EXPIRES = 3600
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+CELERY_BEAT_SCHEDULE = {
+    "publish-scheduled-posts": {
+        "task": "app.tasks.publish_scheduled_posts",
+        "schedule": float(os.environ.get("SCHEDULED_POSTS_INTERVAL", 10)),
+    },
+    "flush-like-counters": {
+        "task": "app.tasks.flush_like_counters",
+        "schedule": float(os.environ.get("LIKE_COUNTER_FLUSH_INTERVAL", 5)),
+    },
+    "refresh-trending-hashtags": {
+        "task": "app.tasks.refresh_trending_hashtags",
+        "schedule": float(os.environ.get("TRENDING_REFRESH_INTERVAL", 60)),
+    },
+    "rebuild-hashtag-autocomplete": {
+        "task": "app.tasks.rebuild_hashtag_autocomplete",
+        "schedule": 86400.0,
+    },
+    "collect-blobs": {
+        "task": "app.tasks.collect_blobs",
+        "schedule": 3600.0,
+    },
+    "expire-uploads": {
+        "task": "app.tasks.expire_uploads",
+        "schedule": 3600.0,
+    },
+    "compute-follow-suggestions": {
+        "task": "app.tasks.compute_follow_suggestions",
+        "schedule": 86400.0,
+    },
+}
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", REDIS_URL),
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", 300)),
+        "KEY_PREFIX": "social_media",
+    }
+}
+# serialized post and profile payloads, cached per updated_at version
+PAYLOAD_CACHE_TIMEOUT = int(os.environ.get("PAYLOAD_CACHE_TIMEOUT", 3600))
+
+# Like counter write-behind buffer
+LIKE_COUNTER_BUFFERED = (
+    os.environ.get("LIKE_COUNTER_BUFFERED", "False").lower() == "true"
+)
+LIKE_COUNTER_FLUSH_BATCH_SIZE = int(
+    os.environ.get("LIKE_COUNTER_FLUSH_BATCH_SIZE", 500)
+)
+
+# Full-text search configuration of post content
+SEARCH_CONFIG = os.environ.get("SEARCH_CONFIG", "english")
+
+# Home timeline (fan-out on write)
+TIMELINE_BACKFILL_SIZE = int(os.environ.get("TIMELINE_BACKFILL_SIZE", 50))
+TIMELINE_FANOUT_BATCH_SIZE = int(
+    os.environ.get("TIMELINE_FANOUT_BATCH_SIZE", 1000)
+)
+# authors with more followers are not fanned out but merged on read
+TIMELINE_FANOUT_FOLLOWER_LIMIT = int(
+    os.environ.get("TIMELINE_FANOUT_FOLLOWER_LIMIT", 10000)
+)
+TIMELINE_RECENT_POSTS_SIZE = int(
+    os.environ.get("TIMELINE_RECENT_POSTS_SIZE", 100)
+)
+TIMELINE_RECENT_POSTS_TTL = int(
+    os.environ.get("TIMELINE_RECENT_POSTS_TTL", 60 * 60 * 24)
+)
 
 # INTERNAL_IPS = [
 #     "127.0.0.1",
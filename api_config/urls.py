@@ -28,9 +28,13 @@ from drf_spectacular.views import (
 
 from debug_toolbar.toolbar import debug_toolbar_urls
 
+from app.views import LivenessView, ReadinessView
+
 urlpatterns = (
     [
         path("admin/", admin.site.urls),
+        path("healthz/", LivenessView.as_view(), name="healthz"),
+        path("readyz/", ReadinessView.as_view(), name="readyz"),
         path("api/", include("app.urls"), name="app"),
         path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
         path(
@@ -0,0 +1,153 @@
+"""Async variants of the feed read endpoints, served under ASGI.
+
+They return the same payloads, cursors and validators as their sync
+counterparts. Token snapshots and like deltas are read with the async
+Redis client, rows with the async ORM, so a worker does not hold a
+thread per request while waiting. Payload cache reads and profile
+serialization run in the shared thread pool, only the ORM queries of
+posts missing in the cache wait for Django's thread sensitive executor.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from app import likes, payloads, timeline
+from app.authentication import CachedTokenAuthentication
+from app.conditional import get_validators, set_validators
+from app.models import Profile
+from app.pagination import KeysetPagination
+from app.views import PostViewSet
+
+
+class AsyncReadView(View):
+    """Base of async read endpoints authenticated with cached tokens."""
+
+    http_method_names = ["get", "head", "options"]
+    authentication = CachedTokenAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user_auth = await self.authentication.aauthenticate(request)
+            if user_auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = user_auth
+            self.request = Request(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = JsonResponse(
+                {"detail": exc.detail}, status=exc.status_code
+            )
+            if isinstance(
+                exc,
+                (exceptions.NotAuthenticated, exceptions.AuthenticationFailed),
+            ):
+                response["WWW-Authenticate"] = (
+                    self.authentication.authenticate_header(request)
+                )
+            return response
+
+    async def get_conditional_response(
+        self, objects, render, extra=None, many=False
+    ):
+        """Return 304 if the client holds current objects, otherwise the
+        JSON of the data returned by awaited render()."""
+        etag, last_modified = get_validators(objects, extra, many)
+        response = get_conditional_response(
+            self.request._request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = JsonResponse(await render(), safe=False)
+        set_validators(response, etag, last_modified)
+        return response
+
+
+class AsyncPostPageView(AsyncReadView):
+    """Page of posts serialized from the payload cache."""
+
+    queryset = PostViewSet.queryset.select_related(None).prefetch_related(None)
+
+    async def get_page_response(self, paginator, posts):
+        pending_likes = await likes.apending([post.id for post in posts])
+
+        async def render():
+            cached = await sync_to_async(
+                payloads.cached_post_payloads, thread_sensitive=False
+            )(posts)
+            missing_ids = [post.id for post in posts if post.id not in cached]
+            if missing_ids:
+                cached.update(
+                    await sync_to_async(payloads.serialize_posts)(
+                        missing_ids, PostViewSet.queryset
+                    )
+                )
+            return {
+                "next": paginator.next,
+                "previous": paginator.previous,
+                "results": payloads.render_post_payloads(
+                    posts, cached, self.request, pending_likes
+                ),
+            }
+
+        return await self.get_conditional_response(
+            posts, render, extra=pending_likes, many=True
+        )
+
+
+class AsyncPostListView(AsyncPostPageView):
+    """Async endpoint for the list of posts, filters as in `/api/post/`."""
+
+    async def get(self, request, *args, **kwargs):
+        queryset, ordering = PostViewSet.filter_posts(
+            self.queryset, self.request.query_params
+        )
+        if ordering is not None:
+            self.keyset_ordering = ordering
+        paginator = KeysetPagination()
+        posts = await paginator.apaginate_queryset(
+            queryset, self.request, view=self
+        )
+        return await self.get_page_response(paginator, posts)
+
+
+class AsyncMyFollowingPostsView(AsyncPostPageView):
+    """Async endpoint for posts of my following from my timeline."""
+
+    async def get(self, request, *args, **kwargs):
+        paginator = KeysetPagination()
+        items = await paginator.apaginate_source(
+            sync_to_async(partial(timeline.read, request.user.id)),
+            self.request,
+            view=self,
+        )
+        post_ids = [item.id for item in items]
+        posts = await self.queryset.ain_bulk(post_ids)
+        return await self.get_page_response(
+            paginator,
+            [posts[post_id] for post_id in post_ids if post_id in posts],
+        )
+
+
+class AsyncProfileDetailView(AsyncReadView):
+    """Async endpoint for a profile, as `/api/profile/{id}/`."""
+
+    async def get(self, request, pk, *args, **kwargs):
+        profile = (
+            await Profile.objects.select_related("user").filter(pk=pk).afirst()
+        )
+        if profile is None:
+            raise exceptions.NotFound()
+        return await self.get_conditional_response(
+            [profile],
+            partial(
+                sync_to_async(
+                    payloads.profile_payload, thread_sensitive=False
+                ),
+                profile,
+            ),
+        )
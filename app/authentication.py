@@ -0,0 +1,233 @@
+"""Token authentication without a database query per request.
+
+Users of tokens are cached as snapshots of a few fields, in a small per
+process TTL cache for `AUTH_TOKEN_LOCAL_TTL` seconds in front of Redis
+for `AUTH_TOKEN_CACHE_TTL` seconds. Deleting a token (logout, rotation)
+or saving its user drops the cached snapshot, other processes may still
+accept it from their local cache for up to `AUTH_TOKEN_LOCAL_TTL`
+seconds. Fields missing from the snapshot are loaded from the database on
+first access.
+
+When Redis is unavailable users are loaded from the database, as without
+the cache.
+
+Tokens older than `AUTH_TOKEN_TTL` seconds are rejected and replaced on
+the next login, 0 keeps them valid until logout.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from redis import RedisError
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from app import metrics
+from app.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+TOKEN_KEY = "auth:token:{key}"
+SNAPSHOT_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+metrics.register("auth.token_queries")
+
+_local = TTLCache(
+    maxsize=settings.AUTH_TOKEN_LOCAL_SIZE, ttl=settings.AUTH_TOKEN_LOCAL_TTL
+)
+_local_lock = threading.Lock()
+
+
+def expires_at(token: Token):
+    """Return expiry time of the token, None if tokens do not expire."""
+    if not settings.AUTH_TOKEN_TTL:
+        return None
+    return token.created + timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def _get_local(key: str):
+    with _local_lock:
+        return _local.get(key)
+
+
+def _set_local(key: str, snapshot: dict) -> None:
+    with _local_lock:
+        _local[key] = snapshot
+
+
+def _take_snapshot(token) -> dict:
+    if token is None:
+        return None
+    snapshot = {field: getattr(token.user, field) for field in SNAPSHOT_FIELDS}
+    expires = expires_at(token)
+    snapshot["expires"] = expires and expires.timestamp()
+    return snapshot
+
+
+def _snapshot(key: str):
+    snapshot = _get_local(key)
+    if snapshot is not None:
+        return snapshot
+    redis = get_redis()
+    try:
+        cached = redis.get(TOKEN_KEY.format(key=key))
+    except RedisError:
+        logger.exception("Token cache is unavailable")
+        cached = redis = None
+    if cached is not None:
+        snapshot = json.loads(cached)
+    else:
+        metrics.incr("auth.token_queries")
+        snapshot = _take_snapshot(
+            Token.objects.select_related("user").filter(key=key).first()
+        )
+        if snapshot is None:
+            return None
+        if redis is not None:
+            try:
+                redis.set(
+                    TOKEN_KEY.format(key=key),
+                    json.dumps(snapshot),
+                    ex=settings.AUTH_TOKEN_CACHE_TTL,
+                )
+            except RedisError:
+                logger.exception("Token cache is unavailable")
+    _set_local(key, snapshot)
+    return snapshot
+
+
+async def _asnapshot(key: str):
+    snapshot = _get_local(key)
+    if snapshot is not None:
+        return snapshot
+    redis = get_async_redis()
+    try:
+        cached = await redis.get(TOKEN_KEY.format(key=key))
+    except RedisError:
+        logger.exception("Token cache is unavailable")
+        cached = redis = None
+    if cached is not None:
+        snapshot = json.loads(cached)
+    else:
+        await metrics.aincr("auth.token_queries")
+        snapshot = _take_snapshot(
+            await Token.objects.select_related("user").filter(key=key).afirst()
+        )
+        if snapshot is None:
+            return None
+        if redis is not None:
+            try:
+                await redis.set(
+                    TOKEN_KEY.format(key=key),
+                    json.dumps(snapshot),
+                    ex=settings.AUTH_TOKEN_CACHE_TTL,
+                )
+            except RedisError:
+                logger.exception("Token cache is unavailable")
+    _set_local(key, snapshot)
+    return snapshot
+
+
+def invalidate(keys) -> None:
+    """Drop cached users of the tokens once the transaction commits."""
+    keys = list(keys)
+    if not keys:
+        return
+
+    def drop():
+        with _local_lock:
+            for key in keys:
+                _local.pop(key, None)
+        get_redis().delete(*[TOKEN_KEY.format(key=key) for key in keys])
+
+    transaction.on_commit(drop, robust=True)
+
+
+def issue(user) -> Token:
+    """Return the token of the user, replacing an expired one."""
+    token, created = Token.objects.get_or_create(user=user)
+    expires = expires_at(token)
+    if not created and expires is not None and expires <= timezone.now():
+        return rotate(user)
+    return token
+
+
+def rotate(user) -> Token:
+    """Replace the token of the user with a new one."""
+    with transaction.atomic():
+        Token.objects.filter(user=user).delete()
+        return Token.objects.create(user=user)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication served from cached user snapshots."""
+
+    def get_key(self, request):
+        """Return the token of the Authorization header, None without one."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _(
+                    "Invalid token header. "
+                    "Token string should not contain invalid characters."
+                )
+            )
+
+    def get_user(self, key: str, snapshot) -> tuple:
+        if snapshot is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not snapshot["is_active"]:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+        expires = snapshot["expires"]
+        if expires is not None and expires <= time.time():
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        model = get_user_model()
+        fields = [
+            field.attname
+            for field in model._meta.concrete_fields
+            if field.attname in SNAPSHOT_FIELDS
+        ]
+        user = model.from_db(
+            DEFAULT_DB_ALIAS, fields, [snapshot[field] for field in fields]
+        )
+        return user, Token(key=key, user=user)
+
+    def authenticate_credentials(self, key):
+        return self.get_user(key, _snapshot(key))
+
+    async def aauthenticate(self, request):
+        """Authenticate a plain Django request from an async view."""
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.get_user(key, await _asnapshot(key))
@@ -0,0 +1,90 @@
+"""Hashtag prefix autocomplete ranked by usage.
+
+Every prefix of a hashtag up to `HASHTAG_PREFIX_LENGTH` characters has a
+Redis sorted set of hashtags starting with it, scored by the number of
+published posts using them. Uses are counted as posts are published and
+the index is periodically rebuilt from the database, which also trims
+every prefix to its `HASHTAG_AUTOCOMPLETE_SIZE` most used hashtags.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from app.models import Hashtag
+from app.redis_client import get_redis
+
+PREFIX_KEY = "hashtags:prefix:{prefix}"
+
+
+def _prefixes(text: str) -> list:
+    length = min(len(text), settings.HASHTAG_PREFIX_LENGTH)
+    return [text[:size] for size in range(1, length + 1)]
+
+
+def record(hashtags) -> None:
+    """Count uses of the hashtags once the transaction commits, failures
+    are logged and repaired by the next rebuild."""
+    counts = Counter(hashtag.text for hashtag in hashtags)
+    if not counts:
+        return
+
+    def increment():
+        pipe = get_redis().pipeline(transaction=False)
+        for text, count in counts.items():
+            for prefix in _prefixes(text):
+                pipe.zincrby(PREFIX_KEY.format(prefix=prefix), count, text)
+        pipe.execute()
+
+    transaction.on_commit(increment, robust=True)
+
+
+def suggest(prefix: str, limit: int) -> list:
+    """Return (text, uses) pairs of the most used hashtags starting with
+    prefix."""
+    prefix = Hashtag.normalize(prefix)
+    if not prefix:
+        return []
+    key = PREFIX_KEY.format(prefix=prefix[: settings.HASHTAG_PREFIX_LENGTH])
+    if len(prefix) <= settings.HASHTAG_PREFIX_LENGTH:
+        entries = get_redis().zrevrange(key, 0, limit - 1, withscores=True)
+    else:
+        entries = [
+            (text, score)
+            for text, score in get_redis().zrevrange(
+                key, 0, -1, withscores=True
+            )
+            if text.decode().startswith(prefix)
+        ][:limit]
+    return [(text.decode(), int(score)) for text, score in entries]
+
+
+def rebuild() -> int:
+    """Recompute the index from the database, return number of hashtags."""
+    redis = get_redis()
+    size = settings.HASHTAG_AUTOCOMPLETE_SIZE
+    index = {}
+    count = 0
+    hashtags = (
+        Hashtag.objects.annotate(
+            uses=Count("posts", filter=Q(posts__is_published=True))
+        )
+        .filter(uses__gt=0)
+        .values_list("text", "uses")
+    )
+    for text, uses in hashtags.iterator():
+        count += 1
+        for prefix in _prefixes(text):
+            index.setdefault(prefix, {})[text] = uses
+
+    # readers see either the old or the new index
+    pipe = redis.pipeline()
+    for key in redis.scan_iter(PREFIX_KEY.format(prefix="*")):
+        pipe.delete(key)
+    for prefix, scores in index.items():
+        top = dict(Counter(scores).most_common(size))
+        pipe.zadd(PREFIX_KEY.format(prefix=prefix), top)
+    pipe.execute()
+    return count
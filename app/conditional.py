@@ -0,0 +1,67 @@
+"""Conditional GET support based on `updated_at` of the returned rows and
+their denormalized counters."""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def version(obj) -> str:
+    """Return version of the representation of obj, `updated_at` of its
+    content and values of its `counter_fields`, which change without it."""
+    counters = [
+        str(getattr(obj, field))
+        for field in getattr(obj, "counter_fields", ())
+    ]
+    return ":".join([str(obj.updated_at.timestamp()), *counters])
+
+
+def get_validators(objects, extra=None, many=False) -> tuple:
+    """Return ETag and Last-Modified timestamp of the objects.
+
+    `extra` is any state not reflected in the rows that still changes the
+    representation, it only takes part in the ETag. Lists (`many`) have no
+    Last-Modified: rows deleted or unpublished off a page leave the newest
+    `updated_at` of the rest unchanged, only the ETag digest of ids and
+    versions notices. Nor have objects with counters, whose changes do not
+    move `updated_at`.
+    """
+    digest = hashlib.md5(repr(extra).encode(), usedforsecurity=False)
+    last_modified = None
+    counted = False
+    for obj in objects:
+        digest.update(f"{obj.pk}:{version(obj)};".encode())
+        counted = counted or bool(getattr(obj, "counter_fields", ()))
+        if last_modified is None or obj.updated_at > last_modified:
+            last_modified = obj.updated_at
+    etag = f'W/"{digest.hexdigest()}"'
+    if many or counted or last_modified is None:
+        return etag, None
+    return etag, int(last_modified.timestamp())
+
+
+def set_validators(response, etag: str, last_modified) -> None:
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, ("Authorization",))
+
+
+class ConditionalGetMixin:
+    """Answer `If-None-Match` and `If-Modified-Since` with 304 Not Modified
+    before the response body is serialized."""
+
+    def get_conditional_response(
+        self, objects, render, extra=None, many=False
+    ):
+        """Return 304 if the client holds current objects, otherwise the
+        response built by render()."""
+        etag, last_modified = get_validators(objects, extra, many)
+        response = get_conditional_response(
+            self.request._request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = render()
+        set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,152 @@
+"""Follow graph adjacency kept in Redis for membership checks.
+
+Every user has sorted sets of followed users and of followers, scored by
+the follow time. The `Follow` table is the source of truth: sets are
+loaded from it on first use and expire after `GRAPH_CACHE_TTL`, follows
+and unfollows update only sets that are already loaded. A sentinel member
+marks a loaded set, so users without follows are not reloaded on every
+check. Failed updates are logged and the follow is kept, the stale set
+is corrected when it expires.
+
+Every update bumps a version of the set, loaded or not. A set is loaded
+into a temporary key and renamed into place only if its version did not
+change meanwhile, so a follow committed while the database was read is
+never lost.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from app.models import Follow
+from app.redis_client import get_redis
+
+FOLLOWING_KEY = "graph:following:{user_id}"
+FOLLOWERS_KEY = "graph:followers:{user_id}"
+VERSION_KEY = "{key}:version"
+LOADED = 0
+LOAD_BATCH_SIZE = 10000
+LOAD_ATTEMPTS = 3
+# seconds a set that kept changing while it was loaded is trusted
+STALE_TTL = 5
+
+# ZADD/ZREM on a set only if it is loaded, a missing set is loaded from
+# the database on next use with the change already in place
+UPDATE_IF_LOADED = """
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[4])
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    if ARGV[1] == "add" then
+        redis.call("ZADD", KEYS[1], ARGV[3], ARGV[2])
+    else
+        redis.call("ZREM", KEYS[1], ARGV[2])
+    end
+end
+"""
+
+# rename a loaded set into place unless it was updated since the load began
+INSTALL_IF_CURRENT = """
+if (redis.call("GET", KEYS[3]) or "0") ~= ARGV[1] then
+    redis.call("DEL", KEYS[2])
+    return 0
+end
+redis.call("RENAME", KEYS[2], KEYS[1])
+return 1
+"""
+
+
+def _fill(redis, key: str, edges, ttl: int) -> None:
+    pipe = redis.pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, {LOADED: 0})
+    batch = {}
+    for user_id, created_at in edges.iterator(chunk_size=LOAD_BATCH_SIZE):
+        batch[user_id] = created_at.timestamp()
+        if len(batch) >= LOAD_BATCH_SIZE:
+            pipe.zadd(key, batch)
+            batch = {}
+    if batch:
+        pipe.zadd(key, batch)
+    pipe.expire(key, ttl)
+    pipe.execute()
+
+
+def _load(key: str, edges) -> None:
+    redis = get_redis()
+    install = redis.register_script(INSTALL_IF_CURRENT)
+    version_key = VERSION_KEY.format(key=key)
+    for _ in range(LOAD_ATTEMPTS):
+        version = redis.get(version_key) or b"0"
+        loading_key = f"{key}:loading:{uuid.uuid4().hex}"
+        _fill(redis, loading_key, edges, settings.GRAPH_CACHE_TTL)
+        if install(keys=[key, loading_key, version_key], args=[version]):
+            return
+    _fill(redis, key, edges, STALE_TTL)
+
+
+def following_key(user_id: int) -> str:
+    """Return key of the loaded set of users followed by the user."""
+    key = FOLLOWING_KEY.format(user_id=user_id)
+    if not get_redis().exists(key):
+        _load(
+            key,
+            Follow.objects.filter(follower_id=user_id).values_list(
+                "followee_id", "created_at"
+            ),
+        )
+    return key
+
+
+def followers_key(user_id: int) -> str:
+    """Return key of the loaded set of the user's followers."""
+    key = FOLLOWERS_KEY.format(user_id=user_id)
+    if not get_redis().exists(key):
+        _load(
+            key,
+            Follow.objects.filter(followee_id=user_id).values_list(
+                "follower_id", "created_at"
+            ),
+        )
+    return key
+
+
+def _update(follow: Follow, action: str) -> None:
+    script = get_redis().register_script(UPDATE_IF_LOADED)
+    score = follow.created_at.timestamp()
+    for key, member in (
+        (FOLLOWING_KEY.format(user_id=follow.follower_id), follow.followee_id),
+        (FOLLOWERS_KEY.format(user_id=follow.followee_id), follow.follower_id),
+    ):
+        script(
+            keys=[key, VERSION_KEY.format(key=key)],
+            args=[action, member, score, settings.GRAPH_CACHE_TTL],
+        )
+
+
+def add_follow(follow: Follow) -> None:
+    transaction.on_commit(lambda: _update(follow, "add"), robust=True)
+
+
+def remove_follow(follow: Follow) -> None:
+    transaction.on_commit(lambda: _update(follow, "remove"), robust=True)
+
+
+def is_following(follower_id: int, followee_id: int) -> bool:
+    return (
+        get_redis().zscore(following_key(follower_id), followee_id) is not None
+    )
+
+
+def mutual_followers(user_id: int, other_id: int, limit: int) -> list:
+    """Return ids of users following both users, recent followers of the
+    other user first."""
+    # scores of the intersection are the times of following the other user
+    members = get_redis().zinter(
+        {followers_key(user_id): 0, followers_key(other_id): 1},
+        withscores=True,
+    )
+    members.sort(key=lambda member: member[1], reverse=True)
+    return [int(member) for member, _ in members if int(member) != LOADED][
+        :limit
+    ]
@@ -0,0 +1,75 @@
+"""Resized renditions of uploaded images.
+
+Every rendition is stored in WebP and JPEG next to the original picture,
+`Image.renditions` maps rendition names to their files and dimensions.
+"""
+
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+RENDITIONS = {
+    "thumbnail": (320, 320),
+    "feed": (1080, 1080),
+    "full": (1920, 1920),
+}
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def _encode(img: PILImage.Image, fmt: str) -> bytes:
+    if fmt == "JPEG" and img.mode != "RGB":
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, fmt, quality=settings.IMAGE_RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def render(image) -> dict:
+    """Store renditions of the image picture, return their description."""
+    with image.picture.open("rb") as picture:
+        original = ImageOps.exif_transpose(PILImage.open(picture))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA")
+
+    path = PurePosixPath(image.picture.name)
+    renditions = {}
+    for name, size in RENDITIONS.items():
+        img = original.copy()
+        img.thumbnail(size)
+        files = {}
+        for ext, fmt in FORMATS.items():
+            files[ext] = default_storage.save(
+                str(path.parent / "renditions" / f"{path.stem}-{name}.{ext}"),
+                ContentFile(_encode(img, fmt)),
+            )
+        renditions[name] = {
+            "width": img.width,
+            "height": img.height,
+            **files,
+        }
+    return renditions
+
+
+def delete(renditions: dict) -> None:
+    """Remove stored rendition files."""
+    for rendition in renditions.values():
+        for ext in FORMATS:
+            if ext in rendition:
+                default_storage.delete(rendition[ext])
+
+
+def urls(renditions: dict) -> dict:
+    """Return renditions with file names replaced by storage URLs."""
+    return {
+        name: {
+            key: default_storage.url(value) if key in FORMATS else value
+            for key, value in rendition.items()
+        }
+        for name, rendition in renditions.items()
+    }
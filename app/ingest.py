@@ -0,0 +1,71 @@
+"""Bulk creation of posts, used by the bulk endpoint and `import_posts`.
+
+Posts of a batch are inserted with one statement, their hashtags are
+resolved at once and the hashtag links inserted in bulk. Side effects of
+`Post.save()` (search vector and timeline fan-out) are applied to the whole
+batch, scheduled posts are left to `publish_scheduled_posts`.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from app import autocomplete, trending
+from app.models import Hashtag, Post
+from app.serializers import PostBulkSerializer
+from app.tasks import fan_out_posts
+
+
+def validate_posts(entries) -> tuple:
+    """Validate (author_id, data) entries.
+    Return (post, hashtag texts) pairs and errors by entry index."""
+    valid = []
+    errors = {}
+    for index, (author_id, data) in enumerate(entries):
+        serializer = PostBulkSerializer(data=data)
+        if not serializer.is_valid():
+            errors[index] = serializer.errors
+            continue
+        fields = dict(serializer.validated_data)
+        texts = {hashtag["text"] for hashtag in fields.pop("hashtags", [])}
+        valid.append((Post(author_id=author_id, **fields), texts))
+    return valid, errors
+
+
+def create_posts(entries) -> tuple:
+    """Validate and create posts given as (author_id, data) entries.
+    Return created posts and validation errors by entry index."""
+    valid, errors = validate_posts(entries)
+    if not valid:
+        return [], errors
+    batch_size = settings.POST_BULK_BATCH_SIZE
+    with transaction.atomic():
+        posts = Post.objects.bulk_create(
+            [post for post, _ in valid], batch_size=batch_size
+        )
+        Post.index_search([post.id for post in posts])
+        hashtags = Hashtag.resolve(
+            text for _, texts in valid for text in texts
+        )
+        PostHashtag = Post.hashtags.through
+        PostHashtag.objects.bulk_create(
+            [
+                PostHashtag(post_id=post.id, hashtag_id=hashtags[text].id)
+                for post, texts in valid
+                for text in texts
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # hashtags of scheduled posts are counted once they are published
+        used = [
+            hashtags[text]
+            for post, texts in valid
+            if post.is_published
+            for text in texts
+        ]
+        trending.record(used)
+        autocomplete.record(used)
+        published = [post.id for post in posts if post.is_published]
+        if published:
+            transaction.on_commit(lambda: fan_out_posts.delay(published))
+    return posts, errors
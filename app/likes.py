@@ -0,0 +1,207 @@
+"""Like counter of posts with an optional write-behind buffer.
+
+With `LIKE_COUNTER_BUFFERED` enabled like/unlike deltas are accumulated in
+a Redis hash instead of updating the hot `Post` row, and a periodic task
+flushes them to the database in batches. Reads add the pending deltas to
+the persisted `Post.like_count`. Counters never drop below zero, and
+`flushed()` lets counters be recomputed without racing a flush.
+
+A flush moves pending deltas to a batch with a new id. The batch id is
+recorded in the transaction applying its deltas, so a batch left behind
+by a crashed flush or an expired lock is never applied twice, and readers
+skip deltas of a batch that is already applied.
+"""
+
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from app import metrics
+from app.models import LikeFlush, Post
+from app.redis_client import get_async_redis, get_redis
+
+PENDING_KEY = "likes:pending"
+FLUSHING_KEY = "likes:flushing"
+BATCH_KEY = "likes:flushing-batch"
+# applied batch ids are kept long enough to outlive any stale flush
+BATCH_RETENTION = timedelta(days=1)
+FLUSH_LOCK_KEY = "likes:flush-lock"
+
+metrics.register("likes.flushed_posts", "likes.flushed_delta")
+
+
+def record(post_id: int, delta: int) -> None:
+    """Apply like counter delta of the post, must run in a transaction."""
+    if not delta:
+        return
+    if not settings.LIKE_COUNTER_BUFFERED:
+        Post.update_counters(post_id, likes=delta)
+        return
+    # a lost delta is logged, reconcile_post_counters repairs the counter
+    transaction.on_commit(
+        lambda: get_redis().hincrby(PENDING_KEY, post_id, delta), robust=True
+    )
+
+
+def _deltas(post_ids, waiting, flushing) -> dict:
+    return {
+        post_id: int(first or 0) + int(second or 0)
+        for post_id, first, second in zip(post_ids, waiting, flushing)
+        if first or second
+    }
+
+
+def _read_pending(pipe, post_ids) -> None:
+    pipe.hmget(PENDING_KEY, post_ids)
+    pipe.hmget(FLUSHING_KEY, post_ids)
+    pipe.get(BATCH_KEY)
+
+
+def pending(post_ids) -> dict:
+    """Return not yet flushed like deltas of the posts."""
+    post_ids = list(post_ids)
+    if not settings.LIKE_COUNTER_BUFFERED or not post_ids:
+        return {}
+    pipe = get_redis().pipeline()
+    _read_pending(pipe, post_ids)
+    waiting, flushing, batch = pipe.execute()
+    # the batch table is only queried while a flush is under way
+    if any(flushing) and _is_applied(batch):
+        flushing = [None] * len(post_ids)
+    return _deltas(post_ids, waiting, flushing)
+
+
+def pending_post_ids() -> list:
+    """Return ids of posts with not yet flushed like deltas."""
+    if not settings.LIKE_COUNTER_BUFFERED:
+        return []
+    redis = get_redis()
+    keys = set(redis.hkeys(PENDING_KEY))
+    if not _is_applied(redis.get(BATCH_KEY)):
+        keys |= set(redis.hkeys(FLUSHING_KEY))
+    return [int(post_id) for post_id in keys]
+
+
+async def apending(post_ids) -> dict:
+    """Async variant of `pending`."""
+    post_ids = list(post_ids)
+    if not settings.LIKE_COUNTER_BUFFERED or not post_ids:
+        return {}
+    pipe = get_async_redis().pipeline()
+    _read_pending(pipe, post_ids)
+    waiting, flushing, batch = await pipe.execute()
+    if any(flushing) and await _ais_applied(batch):
+        flushing = [None] * len(post_ids)
+    return _deltas(post_ids, waiting, flushing)
+
+
+def _is_applied(batch) -> bool:
+    return (
+        batch is not None
+        and LikeFlush.objects.filter(batch=batch.decode()).exists()
+    )
+
+
+async def _ais_applied(batch) -> bool:
+    return (
+        batch is not None
+        and await LikeFlush.objects.filter(batch=batch.decode()).aexists()
+    )
+
+
+def _apply(batch: str, deltas: dict) -> bool:
+    """Apply deltas of the batch unless it was applied before, return
+    whether they were applied."""
+    batch_size = settings.LIKE_COUNTER_FLUSH_BATCH_SIZE
+    items = sorted(deltas.items())
+    with transaction.atomic():
+        _, created = LikeFlush.objects.get_or_create(batch=batch)
+        if not created:
+            return False
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            Post.objects.filter(
+                pk__in=[post_id for post_id, _ in batch]
+            ).update(
+                # deltas of reconciled counters must not push them below 0
+                like_count=Greatest(
+                    Value(0),
+                    F("like_count")
+                    + Case(
+                        *[
+                            When(pk=post_id, then=Value(delta))
+                            for post_id, delta in batch
+                        ],
+                        default=Value(0),
+                    ),
+                ),
+            )
+    return True
+
+
+def _flush(redis) -> dict:
+    # a batch left by an interrupted flush is applied first
+    if not redis.exists(FLUSHING_KEY):
+        if not redis.exists(PENDING_KEY):
+            return {}
+        pipe = redis.pipeline()
+        pipe.rename(PENDING_KEY, FLUSHING_KEY)
+        pipe.set(BATCH_KEY, str(uuid.uuid4()))
+        pipe.execute()
+    batch = redis.get(BATCH_KEY)
+    if batch is None:
+        # left by a flush of a version without batch ids
+        batch = str(uuid.uuid4()).encode()
+        redis.set(BATCH_KEY, batch)
+    deltas = {
+        int(post_id): int(delta)
+        for post_id, delta in redis.hgetall(FLUSHING_KEY).items()
+        if int(delta)
+    }
+    applied = _apply(batch.decode(), deltas)
+    pipe = redis.pipeline()
+    pipe.delete(FLUSHING_KEY)
+    pipe.delete(BATCH_KEY)
+    pipe.execute()
+    LikeFlush.objects.filter(
+        created_at__lt=timezone.now() - BATCH_RETENTION
+    ).delete()
+    if not applied:
+        return {}
+    metrics.incr("likes.flushed_posts", len(deltas))
+    metrics.incr("likes.flushed_delta", sum(deltas.values()))
+    return deltas
+
+
+def flush() -> int:
+    """Move pending deltas into `Post.like_count`, return flushed posts."""
+    redis = get_redis()
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=settings.CELERY_TASK_TIME_LIMIT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        return len(_flush(redis))
+    finally:
+        lock.release()
+
+
+@contextmanager
+def flushed():
+    """Flush pending deltas and hold off further flushes in the block.
+
+    Deltas recorded meanwhile stay pending, `pending()` returns them.
+    """
+    redis = get_redis()
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=settings.CELERY_TASK_TIME_LIMIT)
+    lock.acquire()
+    try:
+        _flush(redis)
+        yield
+    finally:
+        lock.release()
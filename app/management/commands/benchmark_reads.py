@@ -0,0 +1,89 @@
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+# sync endpoints and their async variants
+PATHS = (
+    ("/api/post/", "/api/async/post/"),
+    ("/api/post/my_following/", "/api/async/post/my_following/"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput and latency of the sync and async feed reads "
+        "of running servers at increasing concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the WSGI server.")
+        parser.add_argument(
+            "--async-url",
+            help="Base URL of the ASGI server, the WSGI one by default.",
+        )
+        parser.add_argument("--token", required=True, help="Auth token.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 8, 32, 64],
+            help="Numbers of concurrent clients.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Requests sent per endpoint and concurrency.",
+        )
+
+    def fetch(self, url: str, token: str) -> float:
+        request = urllib.request.Request(
+            url, headers={"Authorization": f"Token {token}"}
+        )
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    def run(self, url: str, token: str, concurrency: int, requests: int):
+        with ThreadPoolExecutor(concurrency) as executor:
+            start = time.perf_counter()
+            latencies = sorted(
+                executor.map(lambda _: self.fetch(url, token), range(requests))
+            )
+            elapsed = time.perf_counter() - start
+        return (
+            requests / elapsed,
+            statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        )
+
+    def handle(self, *args, **options):
+        sync_url = options["url"].rstrip("/")
+        async_url = (options["async_url"] or sync_url).rstrip("/")
+        self.stdout.write(
+            f"{'endpoint':<32}{'clients':>8}{'req/s':>10}"
+            f"{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for sync_path, async_path in PATHS:
+            for base_url, path in (
+                (sync_url, sync_path),
+                (async_url, async_path),
+            ):
+                for concurrency in options["concurrency"]:
+                    try:
+                        rate, p50, p99 = self.run(
+                            base_url + path,
+                            options["token"],
+                            concurrency,
+                            options["requests"],
+                        )
+                    except OSError as exc:
+                        raise CommandError(f"{path}: {exc}")
+                    self.stdout.write(
+                        f"{path:<32}{concurrency:>8}{rate:>10.1f}"
+                        f"{p50:>10.1f}{p99:>10.1f}"
+                    )
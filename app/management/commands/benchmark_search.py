@@ -0,0 +1,142 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.settings import api_settings
+
+from app.models import Post
+from app.views import PostViewSet
+
+AUTHOR = "benchmark-search@example.com"
+# word ranks of the vocabulary used for content, from common to rare
+VOCABULARY_SIZE = 50_000
+QUERIES = ("word1", "word50", "word2000", "word40000", "word1 word50")
+
+
+def vocabulary() -> tuple:
+    """Words and their cumulative Zipf weights, `word1` is the most
+    common."""
+    words = [f"word{rank}" for rank in range(1, VOCABULARY_SIZE + 1)]
+    weights = list(
+        accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1))
+    )
+    return words, weights
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure full-text search of post content against the icontains "
+        "filter it replaced, over generated posts. Run it against a "
+        "scratch database, generated posts are kept for later runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts",
+            type=int,
+            default=1_000_000,
+            help="Number of generated posts to search.",
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=30,
+            help="Words per generated post.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Runs of each query.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Posts created per transaction.",
+        )
+        parser.add_argument(
+            "--clean",
+            action="store_true",
+            help="Delete the generated posts and exit.",
+        )
+
+    def generate(self, author, count: int, words: int, batch_size: int):
+        vocabulary_words, weights = vocabulary()
+        rng = random.Random(0)
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            with transaction.atomic():
+                posts = Post.objects.bulk_create(
+                    Post(
+                        author=author,
+                        content=" ".join(
+                            rng.choices(
+                                vocabulary_words, cum_weights=weights, k=words
+                            )
+                        ),
+                    )
+                    for _ in range(size)
+                )
+                Post.index_search([post.id for post in posts])
+            created += size
+            self.stdout.write(f"generated {created} posts", ending="\r")
+        self.stdout.write("")
+
+    def measure(self, queryset, repeat: int) -> tuple:
+        page_size = api_settings.PAGE_SIZE
+        list(queryset[: page_size + 1])
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset[: page_size + 1])
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return (
+            statistics.median(timings) * 1000,
+            timings[int(len(timings) * 0.99) - 1] * 1000,
+        )
+
+    def handle(self, *args, **options):
+        author, _ = get_user_model().objects.get_or_create(
+            email=AUTHOR, defaults={"username": AUTHOR.split("@")[0]}
+        )
+        posts = Post.objects.filter(author=author)
+        if options["clean"]:
+            posts.delete()
+            author.delete()
+            return
+        missing = options["posts"] - posts.count()
+        if missing > 0:
+            self.generate(
+                author, missing, options["words"], options["batch_size"]
+            )
+        self.stdout.write(f"{Post.objects.count()} posts")
+        self.stdout.write(
+            f"{'query':<16}{'filter':<12}{'matches':>10}"
+            f"{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        base = PostViewSet.queryset.select_related(None).prefetch_related(None)
+        for query in QUERIES:
+            ranked, ordering = PostViewSet.filter_posts(
+                base, {"content": query}
+            )
+            ranked = ranked.order_by(*ordering)
+            # the filter full-text search replaced
+            contains = base.filter(content__icontains=query).order_by(
+                "-created_at", "-id"
+            )
+            for name, queryset in (
+                ("full-text", ranked),
+                ("icontains", contains),
+            ):
+                p50, p99 = self.measure(queryset, options["repeat"])
+                self.stdout.write(
+                    f"{query:<16}{name:<12}{queryset.count():>10}"
+                    f"{p50:>10.1f}{p99:>10.1f}"
+                )
@@ -0,0 +1,144 @@
+import os
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app import suggestions
+from app.management.commands.benchmark_upload import MB, PeakRss
+from app.models import Follow, Hashtag, Post
+
+PREFIX = "benchmark-suggestions"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the follow suggestions job over a generated follow graph "
+        "with skewed popularity. Run it against a scratch database, the "
+        "generated users are kept for later runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=1_000_000,
+            help="Number of generated users.",
+        )
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=20,
+            help="Users followed by every generated user.",
+        )
+        parser.add_argument(
+            "--hashtags",
+            type=int,
+            default=3,
+            help="Hashtags of the post of every generated user.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Users generated per transaction.",
+        )
+        parser.add_argument(
+            "--clean",
+            action="store_true",
+            help="Delete the generated users and exit.",
+        )
+
+    def generate(self, count: int, follows: int, tags: int, batch_size):
+        rng = np.random.default_rng(0)
+        Hashtag.objects.bulk_create(
+            [Hashtag(text=f"{PREFIX}{i}") for i in range(1000)],
+            ignore_conflicts=True,
+        )
+        hashtags = list(
+            Hashtag.objects.filter(text__startswith=PREFIX).values_list(
+                "id", flat=True
+            )
+        )
+        users = []
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                users.extend(
+                    user.id
+                    for user in get_user_model().objects.bulk_create(
+                        get_user_model()(
+                            email=f"{PREFIX}-{i}@example.com",
+                            username=f"{PREFIX}-{i}",
+                        )
+                        for i in range(start, min(start + batch_size, count))
+                    )
+                )
+            self.stdout.write(f"generated {len(users)} users", ending="\r")
+        self.stdout.write("")
+        users = np.array(users)
+        for start in range(0, count, batch_size):
+            batch = users[start : start + batch_size]
+            # popularity falls with the index, a few users are followed
+            # by most
+            followees = users[
+                (count * rng.random((len(batch), follows)) ** 3).astype(int)
+            ]
+            tagged = rng.choice(hashtags, (len(batch), tags))
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    (
+                        Follow(follower_id=follower, followee_id=followee)
+                        for follower, row in zip(
+                            batch.tolist(), followees.tolist()
+                        )
+                        for followee in set(row) - {follower}
+                    ),
+                    batch_size=batch_size,
+                )
+                posts = Post.objects.bulk_create(
+                    Post(author_id=author, content="")
+                    for author in batch.tolist()
+                )
+                Post.hashtags.through.objects.bulk_create(
+                    (
+                        Post.hashtags.through(post_id=post.id, hashtag_id=tag)
+                        for post, row in zip(posts, tagged.tolist())
+                        for tag in set(row)
+                    ),
+                    batch_size=batch_size,
+                )
+            self.stdout.write(
+                f"generated follows of {start + len(batch)} users",
+                ending="\r",
+            )
+        self.stdout.write("")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(email__startswith=PREFIX)
+        if options["clean"]:
+            users.delete()
+            Hashtag.objects.filter(text__startswith=PREFIX).delete()
+            return
+        if not users.exists():
+            self.generate(
+                options["users"],
+                options["follows"],
+                options["hashtags"],
+                options["batch_size"],
+            )
+        self.stdout.write(
+            f"{get_user_model().objects.count()} users, "
+            f"{Follow.objects.count()} follows"
+        )
+        rss = PeakRss(os.getpid())
+        rss.start()
+        start = time.perf_counter()
+        stored = suggestions.compute()
+        elapsed = time.perf_counter() - start
+        growth = rss.stop()
+        self.stdout.write(
+            f"{stored} suggestions stored in {elapsed:.1f} s, "
+            f"peak RSS growth {growth / MB:.1f} MB"
+        )
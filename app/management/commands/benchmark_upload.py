@@ -0,0 +1,182 @@
+import io
+import json
+import math
+import os
+import threading
+import time
+import urllib.request
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image as PILImage
+
+MB = 1024 * 1024
+
+
+def noise_png(size: int) -> bytes:
+    """An uncompressed PNG of random pixels of about size bytes."""
+    side = int(math.sqrt(size / 3))
+    image = PILImage.frombytes("RGB", (side, side), os.urandom(side**2 * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=0)
+    return buffer.getvalue()
+
+
+class PeakRss(threading.Thread):
+    """Sample the resident set size of a process until stopped."""
+
+    def __init__(self, pid: int, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.path = f"/proc/{pid}/status"
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.start_rss = self.peak = self.read()
+
+    def read(self) -> int:
+        with open(self.path) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        raise CommandError(f"{self.path} has no VmRSS")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.read())
+
+    def stop(self) -> int:
+        """Return the growth of the RSS over its starting value."""
+        self.stopped.set()
+        self.join()
+        return self.peak - self.start_rss
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput of a chunked image upload against a single "
+        "multipart upload to a running server, and the peak RSS growth "
+        "of its worker process with --pid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the server.")
+        parser.add_argument("--token", required=True, help="Auth token.")
+        parser.add_argument(
+            "--post",
+            type=int,
+            required=True,
+            help="Id of a post of the token owner to attach images to.",
+        )
+        parser.add_argument(
+            "--size", type=int, default=20, help="Image size in MB."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1, help="Chunk size in MB."
+        )
+        parser.add_argument(
+            "--pid", type=int, help="Pid of the worker serving uploads."
+        )
+        parser.add_argument(
+            "--runs", type=int, default=3, help="Uploads of each kind."
+        )
+        parser.add_argument(
+            "--kind",
+            choices=("chunked", "multipart"),
+            nargs="+",
+            default=["chunked", "multipart"],
+            help="Kinds of upload to measure, in order. Start a fresh "
+            "worker for each to compare their peak RSS.",
+        )
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        request = urllib.request.Request(
+            self.url + path,
+            data=body,
+            method=method,
+            headers={
+                "Authorization": f"Token {self.token}",
+                **(headers or {}),
+            },
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read() or "null")
+
+    def upload_chunked(self, image: bytes, chunk_size: int):
+        upload = self.request(
+            "POST",
+            "/api/upload/",
+            json.dumps(
+                {
+                    "post": self.post,
+                    "filename": "benchmark.png",
+                    "size": len(image),
+                }
+            ).encode(),
+            {"Content-Type": "application/json"},
+        )
+        for offset in range(0, len(image), chunk_size):
+            self.request(
+                "PUT",
+                f"/api/upload/{upload['id']}/chunk/",
+                image[offset : offset + chunk_size],
+                {
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": str(offset),
+                },
+            )
+        self.request("POST", f"/api/upload/{upload['id']}/finalize/")
+
+    def upload_multipart(self, image: bytes):
+        boundary = uuid.uuid4().hex
+        body = b"".join(
+            (
+                f"--{boundary}\r\n".encode(),
+                b'Content-Disposition: form-data; name="picture"; '
+                b'filename="benchmark.png"\r\n',
+                b"Content-Type: image/png\r\n\r\n",
+                image,
+                f"\r\n--{boundary}--\r\n".encode(),
+            )
+        )
+        self.request(
+            "POST",
+            f"/api/post/{self.post}/upload_image/",
+            body,
+            {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+
+    def handle(self, *args, **options):
+        self.url = options["url"].rstrip("/")
+        self.token = options["token"]
+        self.post = options["post"]
+        image = noise_png(options["size"] * MB)
+        chunk_size = options["chunk_size"] * MB
+        uploads = {
+            "chunked": lambda: self.upload_chunked(image, chunk_size),
+            "multipart": lambda: self.upload_multipart(image),
+        }
+        self.stdout.write(f"image of {len(image) / MB:.1f} MB")
+        if options["pid"]:
+            rss = PeakRss(options["pid"]).start_rss / MB
+            self.stdout.write(f"worker RSS {rss:.1f} MB")
+        self.stdout.write(
+            f"{'upload':<12}{'run':>4}{'seconds':>10}{'MB/s':>8}"
+            f"{'peak RSS MB':>14}"
+        )
+        for name in options["kind"]:
+            for run in range(1, options["runs"] + 1):
+                rss = PeakRss(options["pid"]) if options["pid"] else None
+                if rss:
+                    rss.start()
+                start = time.perf_counter()
+                try:
+                    uploads[name]()
+                except OSError as exc:
+                    raise CommandError(f"{name} upload: {exc}")
+                elapsed = time.perf_counter() - start
+                if rss:
+                    rss.stop()
+                peak = f"{rss.peak / MB:>14.1f}" if rss else f"{'-':>14}"
+                self.stdout.write(
+                    f"{name:<12}{run:>4}{elapsed:>10.2f}"
+                    f"{len(image) / MB / elapsed:>8.1f}{peak}"
+                )
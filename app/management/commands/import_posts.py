@@ -0,0 +1,92 @@
+import json
+import sys
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from app import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts from a JSON Lines file, one post per line with the "
+        "author's `email`, `content` and optional `hashtags`, "
+        "`is_published`, `time_to_publicate`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, `-` for stdin.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.POST_BULK_MAX_SIZE,
+            help="Number of posts created at once.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            lines = (
+                sys.stdin
+                if options["path"] == "-"
+                else open(options["path"], encoding="utf-8")
+            )
+        except OSError as exc:
+            raise CommandError(exc)
+        created = failed = 0
+        numbered = enumerate(lines, start=1)
+        with lines:
+            while batch := list(islice(numbered, options["batch_size"])):
+                imported, errors = self.import_batch(batch)
+                created += imported
+                failed += len(errors)
+                for line, error in errors.items():
+                    self.stderr.write(f"line {line}: {json.dumps(error)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {created} posts, {failed} failed")
+        )
+
+    def import_batch(self, batch) -> tuple:
+        """Create posts of (line number, line) pairs.
+        Return number of created posts and errors by line number."""
+        items = {}
+        errors = {}
+        for line, text in batch:
+            if not text.strip():
+                continue
+            try:
+                item = json.loads(text)
+            except ValueError as exc:
+                errors[line] = {"detail": str(exc)}
+                continue
+            if not isinstance(item, dict):
+                errors[line] = {
+                    "non_field_errors": [
+                        f"Expected an object, but got "
+                        f"{type(item).__name__}."
+                    ]
+                }
+            elif "email" not in item:
+                errors[line] = {"email": ["This field is required."]}
+            elif not isinstance(item["email"], str):
+                errors[line] = {"email": ["Enter a valid email address."]}
+            else:
+                items[line] = (item.pop("email"), item)
+        authors = dict(
+            get_user_model()
+            .objects.filter(email__in={email for email, _ in items.values()})
+            .values_list("email", "id")
+        )
+        entries = {}
+        for line, (email, item) in items.items():
+            if email in authors:
+                entries[line] = (authors[email], item)
+            else:
+                errors[line] = {"email": [f"User {email} does not exist."]}
+        lines = list(entries)
+        posts, invalid = ingest.create_posts(list(entries.values()))
+        errors.update(
+            {lines[index]: error for index, error in invalid.items()}
+        )
+        return len(posts), dict(sorted(errors.items()))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from app import images
+from app.models import Blob, Image
+from app.tasks import process_image
+
+
+class Command(BaseCommand):
+    help = "Queue rendition processing of pending or failed images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Drop stored renditions and reprocess all images.",
+        )
+
+    def handle(self, *args, **options):
+        image_ids = Image.objects.order_by("id").values_list("id", flat=True)
+        if options["all"]:
+            for blob in Blob.objects.exclude(renditions={}).iterator():
+                images.delete(blob.renditions)
+            Blob.objects.update(renditions={})
+        else:
+            image_ids = image_ids.filter(
+                status__in=(Image.Status.PENDING, Image.Status.FAILED)
+            )
+        queued = 0
+        for image_id in image_ids.iterator():
+            process_image.delay(image_id)
+            queued += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Queued processing of {queued} images")
+        )
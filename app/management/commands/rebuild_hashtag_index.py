@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from app import autocomplete
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hashtag autocomplete index from the database."
+
+    def handle(self, *args, **options):
+        count = autocomplete.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {count} hashtags for autocomplete")
+        )
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from app import likes
+from app.models import Comment, Like, Post
+
+
+def actual_likes():
+    return Coalesce(
+        Subquery(
+            Like.objects.filter(post_id=OuterRef("pk"), is_likes=True)
+            .order_by()
+            .values("post_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def reconciled_likes(pending: dict):
+    """Like counts less deltas still to be flushed, which include them."""
+    if not pending:
+        return actual_likes()
+    return Greatest(
+        Value(0),
+        actual_likes()
+        - Case(
+            *[
+                When(pk=post_id, then=Value(delta))
+                for post_id, delta in pending.items()
+            ],
+            default=Value(0),
+        ),
+    )
+
+
+def actual_comments():
+    return Coalesce(
+        Subquery(
+            Comment.objects.filter(post_id=OuterRef("pk"))
+            .order_by()
+            .values("post_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recompute drifted like and comment counters of posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of posts fixed per UPDATE statement.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        drifted = (
+            Post.objects.annotate(
+                actual_likes=actual_likes(),
+                actual_comments=actual_comments(),
+            )
+            .exclude(
+                like_count=F("actual_likes"),
+                comment_count=F("actual_comments"),
+            )
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        # counters with buffered deltas look drifted until they are flushed
+        post_ids = sorted(set(drifted) | set(likes.pending_post_ids()))
+        for start in range(0, len(post_ids), batch_size):
+            batch = post_ids[start : start + batch_size]
+            with likes.flushed():
+                Post.objects.filter(id__in=batch).update(
+                    like_count=reconciled_likes(likes.pending(batch)),
+                    comment_count=actual_comments(),
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled counters of {len(post_ids)} posts")
+        )
@@ -0,0 +1,84 @@
+"""Lightweight application counters kept in the default cache."""
+
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+from redis import RedisError
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "metrics:"
+REGISTERED = set()
+# connections opened, or taken from the pool, by this process
+_database_connections = 0
+
+
+def register(*names: str) -> None:
+    """Register counter names exposed by the metrics endpoint."""
+    REGISTERED.update(names)
+
+
+def incr(name: str, value: int = 1) -> None:
+    """Increment counter by value, creating it if needed. A counter is
+    lost rather than failing the caller while the cache is down."""
+    key = KEY_PREFIX + name
+    try:
+        if cache.add(key, value, timeout=None):
+            return
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, timeout=None)
+    except RedisError:
+        logger.exception("Counter %s is unavailable", name)
+
+
+async def aincr(name: str, value: int = 1) -> None:
+    """Async variant of `incr`."""
+    key = KEY_PREFIX + name
+    try:
+        if await cache.aadd(key, value, timeout=None):
+            return
+        try:
+            await cache.aincr(key, value)
+        except ValueError:
+            await cache.aset(key, value, timeout=None)
+    except RedisError:
+        logger.exception("Counter %s is unavailable", name)
+
+
+def record_connection() -> None:
+    global _database_connections
+    _database_connections += 1
+
+
+def database_stats() -> dict:
+    """Return database connection stats of this process, including its
+    connection pool if enabled."""
+    stats = {"db.connections": _database_connections}
+    pool = connection.pool
+    if pool is None:
+        return stats
+    pool_stats = pool.get_stats()
+    size = pool_stats.get("pool_size", 0)
+    in_use = size - pool_stats.get("pool_available", 0)
+    return {
+        **stats,
+        "db.pool.size": size,
+        "db.pool.in_use": in_use,
+        "db.pool.max_size": pool.max_size,
+        "db.pool.saturation": round(in_use / pool.max_size, 3),
+        "db.pool.requests": pool_stats.get("requests_num", 0),
+        "db.pool.requests_waiting": pool_stats.get("requests_waiting", 0),
+        "db.pool.requests_wait_ms": pool_stats.get("requests_wait_ms", 0),
+        "db.pool.requests_errors": pool_stats.get("requests_errors", 0),
+    }
+
+
+def snapshot() -> dict:
+    """Return current values of all registered counters."""
+    values = cache.get_many([KEY_PREFIX + name for name in REGISTERED])
+    return {
+        name: values.get(KEY_PREFIX + name, 0) for name in sorted(REGISTERED)
+    }
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_followers(apps, schema_editor):
+    User = apps.get_model("app", "User")
+    Follow = apps.get_model("app", "Follow")
+    followers = (
+        Follow.objects.filter(followee_id=OuterRef("pk"))
+        .order_by()
+        .values("followee_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    User.objects.update(followers_count=Coalesce(Subquery(followers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_followers, reverse_code=migrations.RunPython.noop
+        ),
+    ]
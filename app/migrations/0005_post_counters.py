@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_likes_and_comments(apps, schema_editor):
+    Post = apps.get_model("app", "Post")
+    Like = apps.get_model("app", "Like")
+    Comment = apps.get_model("app", "Comment")
+    likes = (
+        Like.objects.filter(post_id=OuterRef("pk"), is_likes=True)
+        .order_by()
+        .values("post_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    comments = (
+        Comment.objects.filter(post_id=OuterRef("pk"))
+        .order_by()
+        .values("post_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Post.objects.update(
+        like_count=Coalesce(Subquery(likes), 0),
+        comment_count=Coalesce(Subquery(comments), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_likes_and_comments, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:08
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def index_posts(apps, schema_editor):
+    Post = apps.get_model("app", "Post")
+    Post.objects.update(
+        search_vector=SearchVector("content", config=settings.SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_post_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="post_search_vector_idx"
+            ),
+        ),
+        migrations.RunPython(
+            index_posts, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:17
+
+import app.models
+import app.storage
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_picture_references(apps, schema_editor):
+    """Existing uuid named pictures become blobs referenced by their rows."""
+    Blob = apps.get_model("app", "Blob")
+    Image = apps.get_model("app", "Image")
+    Profile = apps.get_model("app", "Profile")
+    references = Counter(Image.objects.values_list("picture", flat=True))
+    references.update(
+        Profile.objects.exclude(picture="")
+        .exclude(picture__isnull=True)
+        .values_list("picture", flat=True)
+    )
+    Blob.objects.bulk_create(
+        [
+            Blob(name=name, ref_count=count)
+            for name, count in references.items()
+            if name
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0010_upload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("renditions", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="image",
+            name="picture",
+            field=models.ImageField(
+                storage=app.storage.ContentAddressedStorage(),
+                upload_to=app.models.upload_image,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="profile",
+            name="picture",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=app.storage.ContentAddressedStorage(),
+                upload_to=app.models.upload_picture,
+            ),
+        ),
+        migrations.RunPython(
+            count_picture_references, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:21
+
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models.functions import Now
+
+
+def normalize(text):
+    """Copy of `Hashtag.normalize` at the time of this migration."""
+    text = "".join(unicodedata.normalize("NFKC", text).split())
+    return text.lstrip("#").casefold()
+
+
+def merge_duplicates(apps, schema_editor):
+    """Normalize hashtags, moving posts of duplicates to the oldest one."""
+    Hashtag = apps.get_model("app", "Hashtag")
+    Post = apps.get_model("app", "Post")
+    PostHashtag = Post.hashtags.through
+    groups = defaultdict(list)
+    for pk, text in Hashtag.objects.order_by("id").values_list("id", "text"):
+        groups[normalize(text) or text].append((pk, text))
+
+    touched_posts = set()
+    for canonical, hashtags in groups.items():
+        if all(text == canonical for _, text in hashtags):
+            continue
+        keep = hashtags[0][0]
+        duplicates = [pk for pk, _ in hashtags[1:]]
+        touched_posts.update(
+            PostHashtag.objects.filter(
+                hashtag_id__in=[pk for pk, _ in hashtags]
+            ).values_list("post_id", flat=True)
+        )
+        PostHashtag.objects.bulk_create(
+            [
+                PostHashtag(post_id=post_id, hashtag_id=keep)
+                for post_id in PostHashtag.objects.filter(
+                    hashtag_id__in=duplicates
+                ).values_list("post_id", flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        Hashtag.objects.filter(pk__in=duplicates).delete()
+        Hashtag.objects.filter(pk=keep).update(text=canonical)
+    Post.objects.filter(pk__in=touched_posts).update(updated_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0011_blob_storage"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
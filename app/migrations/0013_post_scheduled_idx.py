@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_normalize_hashtags"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", False)),
+                fields=["time_to_publicate"],
+                name="post_scheduled_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_following(apps, schema_editor):
+    User = apps.get_model("app", "User")
+    Follow = apps.get_model("app", "Follow")
+    following = (
+        Follow.objects.filter(follower_id=OuterRef("pk"))
+        .order_by()
+        .values("follower_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    User.objects.update(following_count=Coalesce(Subquery(following), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0014_published_post_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_following, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,18 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models
 from django.db.models import Model
+from django.db.models.functions import Now, Upper
 from django.utils import timezone
-from django.utils.text import slugify
 from django.utils.translation import gettext as _
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
-from PIL import Image as PILImage
+from app.storage import blob_storage
+
+import unicodedata
 import uuid
 from pathlib import Path
 
@@ -63,20 +67,51 @@ class User(AbstractUser):
         symmetrical=False,
         related_name="followers",
     )
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            GinIndex(
+                fields=["username"],
+                name="user_username_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["first_name"],
+                name="user_first_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["last_name"],
+                name="user_last_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # icontains compiles to UPPER(column) LIKE UPPER(%s)
+            GinIndex(
+                OpClass(Upper("username"), name="gin_trgm_ops"),
+                name="user_username_upper_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(Upper("first_name"), name="gin_trgm_ops"),
+                name="user_first_name_upper_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(Upper("last_name"), name="gin_trgm_ops"),
+                name="user_last_name_upper_trgm_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"username: {self.username}; email: {self.email}"
 
 
 def upload_picture(instance: "Profile", filename: str) -> Path:
-    filename = (
-        f"{slugify(instance.user.email)}-{uuid.uuid4()}"
-        + Path(filename).suffix
-    )
-    return Path("profile_pictures") / Path(filename)
+    """Final name is given by the content hash, see `blob_storage`"""
+    return Path("blobs") / Path(filename).name
 
 
 class Profile(models.Model):
@@ -88,9 +123,19 @@ class Profile(models.Model):
         related_name="profile",
     )
     picture = models.ImageField(
-        blank=True, null=True, upload_to=upload_picture
+        blank=True, null=True, upload_to=upload_picture, storage=blob_storage
     )
     bio = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="profile_created_id_idx",
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -110,6 +155,16 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["follower", "-created_at", "-id"],
+                name="follow_follower_created_idx",
+            ),
+            models.Index(
+                fields=["followee", "-created_at", "-id"],
+                name="follow_followee_created_idx",
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["follower", "followee"], name="unique_follow"
@@ -135,10 +190,41 @@ class Follow(models.Model):
         )
 
     def __str__(self):
-        return (
-            f"{self.follower.user.username} follows "
-            f"{self.followee.user.username}"
-        )
+        return f"{self.follower.username} follows {self.followee.username}"
+
+
+class FollowSuggestion(models.Model):
+    """User suggested to follow, computed offline from the follow graph."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="follow_suggestions",
+    )
+    suggested = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-score", "-id"]
+        indexes = [
+            models.Index(
+                fields=["user", "-score", "-id"],
+                name="suggestion_user_score_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "suggested"], name="unique_suggestion"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_id} suggested to {self.user_id}"
 
 
 class Hashtag(models.Model):
@@ -147,6 +233,38 @@ class Hashtag(models.Model):
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        self.text = Hashtag.normalize(self.text)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Return canonical form of a hashtag, `#Django ` becomes `django`."""
+        text = "".join(unicodedata.normalize("NFKC", text).split())
+        return text.lstrip("#").casefold()
+
+    @staticmethod
+    def resolve(texts) -> dict:
+        """Return hashtags by normalized text, creating the missing ones in
+        bulk."""
+        texts = set(map(Hashtag.normalize, texts))
+        if not texts:
+            return {}
+        Hashtag.objects.bulk_create(
+            [Hashtag(text=text) for text in texts], ignore_conflicts=True
+        )
+        return {
+            hashtag.text: hashtag
+            for hashtag in Hashtag.objects.filter(text__in=texts)
+        }
+
+
+class PublishedPostManager(models.Manager):
+    """Posts visible to readers, backed by partial indexes"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_published=True)
+
 
 class Post(models.Model):
     """Post model"""
@@ -160,9 +278,45 @@ class Post(models.Model):
     hashtags = models.ManyToManyField(
         Hashtag, related_name="posts", blank=True
     )
+    # scheduled posts are moved to the time they are published
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_published = models.BooleanField(default=True)
     time_to_publicate = models.DateTimeField(null=True, blank=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = models.Manager()
+    published = PublishedPostManager()
+
+    # denormalized counters, part of validators and overlaid on payloads
+    counter_fields = ("like_count", "comment_count")
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+            # author's own posts including not yet published ones
+            models.Index(
+                fields=["author", "-created_at", "-id"],
+                name="post_author_created_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="post_published_created_idx",
+                condition=models.Q(is_published=True),
+            ),
+            models.Index(
+                fields=["author", "-created_at", "-id"],
+                name="post_published_author_idx",
+                condition=models.Q(is_published=True),
+            ),
+            models.Index(
+                fields=["time_to_publicate"],
+                name="post_scheduled_idx",
+                condition=models.Q(is_published=False),
+            ),
+        ]
 
     @staticmethod
     def validate_post(is_published, time_to_publicate, error):
@@ -182,30 +336,141 @@ class Post(models.Model):
             error=ValidationError,
         )
 
+    def save(self, *args, **kwargs):
+        """Save post and refresh its full-text search vector"""
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            Post.index_search([self.pk])
+
+    @staticmethod
+    def index_search(post_ids) -> None:
+        """Recompute full-text search vector of the posts."""
+        Post.objects.filter(pk__in=post_ids).update(
+            search_vector=SearchVector(
+                "content", config=settings.SEARCH_CONFIG
+            )
+        )
+
+    @staticmethod
+    def update_counters(post_id: int, likes: int = 0, comments: int = 0):
+        """Atomically shift denormalized like and comment counters. They
+        leave `updated_at`, which versions cached payloads, untouched."""
+        changes = {}
+        if likes:
+            changes["like_count"] = models.F("like_count") + likes
+        if comments:
+            changes["comment_count"] = models.F("comment_count") + comments
+        if changes:
+            Post.objects.filter(pk=post_id).update(**changes)
+
+    @staticmethod
+    def publish_due(limit: int) -> list:
+        """Publish at most limit posts whose time to publicate has come.
+        Return their ids.
+
+        Rows are claimed with SKIP LOCKED, so concurrent publishers never
+        wait for each other nor publish the same post twice. `created_at`
+        becomes the publication time, lists and timelines are ordered by it.
+        """
+        table = Post._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET is_published = true, created_at = now(), updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE is_published = false AND time_to_publicate <= now()
+                    ORDER BY time_to_publicate
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+                """,
+                [limit],
+            )
+            return [post_id for post_id, in cursor.fetchall()]
+
 
 def upload_image(instance: "Image", filename: str) -> Path:
-    today = timezone.now().strftime("%Y/%m/%d")
-    filename = (
-        f"{slugify(instance.post)}-{uuid.uuid4()}" + Path(filename).suffix
-    )
-    return Path(today) / Path(filename)
+    """Final name is given by the content hash, see `blob_storage`"""
+    return Path("blobs") / Path(filename).name
 
 
 class Image(models.Model):
-    """Image model"""
+    """Image model, renditions are produced by `app.tasks.process_image`"""
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
 
-    picture = models.ImageField(upload_to=upload_image)
+    picture = models.ImageField(upload_to=upload_image, storage=blob_storage)
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="images"
     )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        editable=False,
+    )
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        img = PILImage.open(self.picture.path)
-        if img.height > 1080 or img.width > 1920:
-            img.thumbnail((1080, 1920))
-            img.save(self.picture.path)
+
+class Upload(models.Model):
+    """Resumable chunked upload of a post image, see `app.uploads`"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="uploads",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.size
+
+
+class Blob(models.Model):
+    """Stored picture shared by images and profiles with equal content.
+
+    Unreferenced blobs are removed by `app.tasks.collect_blobs`.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    renditions = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def acquire(name: str) -> None:
+        Blob.objects.get_or_create(name=name)
+        Blob.objects.filter(name=name).update(
+            ref_count=models.F("ref_count") + 1, updated_at=Now()
+        )
+
+    @staticmethod
+    def release(name: str) -> None:
+        Blob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=models.F("ref_count") - 1, updated_at=Now()
+        )
 
 
 class Comment(models.Model):
@@ -220,6 +485,18 @@ class Comment(models.Model):
         Post, on_delete=models.CASCADE, related_name="comments"
     )
     content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="comment_created_id_idx"
+            ),
+            models.Index(
+                fields=["post", "-created_at", "-id"],
+                name="comment_post_created_idx",
+            ),
+        ]
 
     @staticmethod
     def validate_feedback(
@@ -254,9 +531,15 @@ class Like(models.Model):
         related_name="likes",
     )
     is_likes = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("post", "reviewer")
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="like_created_id_idx"
+            ),
+        ]
 
     @staticmethod
     def validate_like(
@@ -274,3 +557,45 @@ class Like(models.Model):
             post=self.post,
             error=ValidationError,
         )
+
+
+class LikeFlush(models.Model):
+    """Batch of buffered like deltas applied to `Post.like_count`, a batch
+    is applied at most once, see `app.likes`"""
+
+    batch = models.UUIDField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.batch)
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline entry of a follower."""
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at", "-post"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_at", "-post"],
+                name="timeline_owner_created_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"post #{self.post_id} in timeline of user #{self.owner_id}"
@@ -0,0 +1,258 @@
+"""Keyset (cursor) pagination over indexed ordering columns."""
+
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+def _split(field: str) -> tuple:
+    """Return field name and whether it is ordered descending."""
+    return field.lstrip("-"), field.startswith("-")
+
+
+def keyset_ordering(ordering, reverse: bool = False) -> list:
+    """Return ordering, flipped for walking backwards."""
+    if not reverse:
+        return list(ordering)
+    return [
+        name if descending else f"-{name}"
+        for name, descending in map(_split, ordering)
+    ]
+
+
+def _lookup(descending: bool, strict: bool) -> str:
+    if descending:
+        return "lt" if strict else "lte"
+    return "gt" if strict else "gte"
+
+
+def keyset_filter(ordering, position, reverse: bool = False) -> Q:
+    """Build a filter selecting rows strictly after position in ordering.
+
+    The leading column gets an inclusive range bound of its own, so the
+    database can answer the query with a range scan of the composite index.
+    """
+    fields = [_split(field) for field in keyset_ordering(ordering, reverse)]
+    after = Q()
+    for index, (name, descending) in enumerate(fields):
+        step = Q(**{f"{name}__{_lookup(descending, True)}": position[index]})
+        for prev_index, (prev_name, _) in enumerate(fields[:index]):
+            step &= Q(**{prev_name: position[prev_index]})
+        after |= step
+    leading, descending = fields[0]
+    bound = Q(**{f"{leading}__{_lookup(descending, False)}": position[0]})
+    return bound & after
+
+
+def _to_int(value) -> int:
+    if type(value) is not int:
+        raise TypeError(value)
+    return value
+
+
+def _to_number(value) -> float:
+    if type(value) not in (int, float) or not math.isfinite(value):
+        raise TypeError(value)
+    return value
+
+
+def _to_datetime(value) -> datetime:
+    # parse_datetime raises ValueError for well formed but invalid dates
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class KeysetPagination(BasePagination):
+    """Paginate by the position of the last seen row instead of an offset,
+    so every page costs the same no matter how deep the client scrolls.
+
+    Views may override `keyset_ordering`, the ordering must be unique
+    and backed by a composite index.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_query_description = "The pagination cursor value."
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    page_size_query_description = "Number of results to return per page."
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+    # converters of cursor values by ordering field, other fields are
+    # numbers such as ranks and scores
+    cursor_fields = {"id": _to_int, "created_at": _to_datetime}
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, view) -> tuple:
+        return tuple(getattr(view, "keyset_ordering", self.ordering))
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return position and direction encoded in the request cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = payload["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError(values)
+            position = tuple(
+                self.cursor_fields.get(_split(field)[0], _to_number)(value)
+                for field, value in zip(self.ordering, values)
+            )
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse: bool = False) -> str:
+        payload = {
+            "p": [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in position
+            ]
+        }
+        if reverse:
+            payload["r"] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode()
+        ).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_position(self, item) -> tuple:
+        return tuple(
+            getattr(item, _split(field)[0]) for field in self.ordering
+        )
+
+    def get_rows(self, queryset, position, reverse: bool, limit: int):
+        """Return at most limit rows of the queryset after position."""
+        if position is not None:
+            queryset = queryset.filter(
+                keyset_filter(self.ordering, position, reverse)
+            )
+        return queryset.order_by(*keyset_ordering(self.ordering, reverse))[
+            :limit
+        ]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a page of the queryset located after the request cursor."""
+
+        def read(position, reverse, limit):
+            return list(self.get_rows(queryset, position, reverse, limit))
+
+        return self.paginate_source(read, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async variant of `paginate_queryset` using the async ORM."""
+
+        async def read(position, reverse, limit):
+            rows = self.get_rows(queryset, position, reverse, limit)
+            return [row async for row in rows]
+
+        return await self.apaginate_source(read, request, view)
+
+    def paginate_source(self, read, request, view=None):
+        """Paginate a custom keyset source.
+
+        `read(position, reverse, limit)` must return at most `limit` items
+        located after position, sorted in the (possibly flipped) ordering.
+        """
+        position, reverse, page_size = self.start_page(request, view)
+        items = list(read(position, reverse, page_size + 1))
+        return self.finish_page(items, position, reverse, page_size)
+
+    async def apaginate_source(self, read, request, view=None):
+        """Async variant of `paginate_source`, awaiting `read`."""
+        position, reverse, page_size = self.start_page(request, view)
+        items = list(await read(position, reverse, page_size + 1))
+        return self.finish_page(items, position, reverse, page_size)
+
+    def start_page(self, request, view) -> tuple:
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        position, reverse = self.decode_cursor(request)
+        return position, reverse, self.get_page_size(request)
+
+    def finish_page(self, items, position, reverse, page_size) -> list:
+        """Trim the extra item read ahead and set links of the page."""
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if reverse:
+            items.reverse()
+
+        self.next = self.previous = None
+        if items:
+            if has_more or reverse:
+                self.next = self.encode_cursor(self.get_position(items[-1]))
+            if position is not None and (has_more or not reverse):
+                self.previous = self.encode_cursor(
+                    self.get_position(items[0]), reverse=True
+                )
+        elif reverse:
+            self.next = remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return items
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.next,
+                "previous": self.previous,
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.page_size_query_description,
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -0,0 +1,129 @@
+"""Cache of serialized post and profile payloads.
+
+Payloads are cached per object version and list pages are assembled from
+them. Entries are keyed by `updated_at` of the rows read for the response,
+which `app.signals` bump whenever the post, its images or hashtags, the
+profile or its user change, so a reader racing a write can never store a
+stale payload under the new version. Likes and comments do not bump it:
+counters are not cached, they are taken from the freshly read rows, so
+payloads of posts getting engagement stay cached.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app import likes, metrics
+from app.images import FORMATS
+from app.models import Post
+from app.serializers import AllPostsListSerializer, ProfileDetailSerializer
+
+POST_KEY = "payload:v4:post:{id}:{version}"
+PROFILE_KEY = "payload:v2:profile:{id}:{version}"
+COUNTERS = Post.counter_fields
+
+metrics.register(
+    "payloads.post.hits",
+    "payloads.post.misses",
+    "payloads.profile.hits",
+    "payloads.profile.misses",
+)
+
+
+def _count(kind: str, hits: int, misses: int) -> None:
+    if hits:
+        metrics.incr(f"payloads.{kind}.hits", hits)
+    if misses:
+        metrics.incr(f"payloads.{kind}.misses", misses)
+
+
+def _post_key(post) -> str:
+    return POST_KEY.format(id=post.id, version=post.updated_at.timestamp())
+
+
+def _absolute_image(image: dict, request) -> dict:
+    renditions = {
+        name: {
+            key: request.build_absolute_uri(value) if key in FORMATS else value
+            for key, value in rendition.items()
+        }
+        for name, rendition in image.get("renditions", {}).items()
+    }
+    return {
+        **image,
+        "picture": request.build_absolute_uri(image["picture"]),
+        "renditions": renditions,
+    }
+
+
+def cached_post_payloads(posts) -> dict:
+    """Return payloads of the posts found in the cache by post id."""
+    keys = {_post_key(post): post.id for post in posts}
+    cached = cache.get_many(keys)
+    _count("post", hits=len(cached), misses=len(keys) - len(cached))
+    return {keys[key]: payload for key, payload in cached.items()}
+
+
+def serialize_posts(post_ids, queryset) -> dict:
+    """Serialize posts with `queryset` and cache them, by post id."""
+    objs = list(queryset.in_bulk(post_ids).values())
+    payloads = {}
+    fresh = {}
+    for obj, payload in zip(
+        objs, AllPostsListSerializer(objs, many=True).data
+    ):
+        payload = dict(payload)
+        for counter in COUNTERS:
+            payload.pop(counter, None)
+        payloads[obj.id] = payload
+        fresh[_post_key(obj)] = payload
+    cache.set_many(fresh, settings.PAYLOAD_CACHE_TIMEOUT)
+    return payloads
+
+
+def render_post_payloads(posts, payloads, request, pending_likes) -> list:
+    """Return payloads of the posts with current counters and absolute
+    image URLs, skipping posts without a payload."""
+    result = []
+    for post in posts:
+        if post.id not in payloads:
+            continue
+        payload = dict(payloads[post.id])
+        payload["images"] = [
+            _absolute_image(image, request) for image in payload["images"]
+        ]
+        payload["like_count"] = post.like_count + pending_likes.get(post.id, 0)
+        payload["comment_count"] = post.comment_count
+        result.append(payload)
+    return result
+
+
+def post_payloads(posts, queryset, request, pending_likes=None) -> list:
+    """Return serialized posts, serializing and caching only missing ones.
+
+    `posts` only need id and counters loaded, `queryset` is used to fetch
+    and serialize posts missing in the cache. Like deltas are read unless
+    `pending_likes` are given.
+    """
+    posts = list(posts)
+    payloads = cached_post_payloads(posts)
+    missing_ids = [post.id for post in posts if post.id not in payloads]
+    if missing_ids:
+        payloads.update(serialize_posts(missing_ids, queryset))
+    if pending_likes is None:
+        pending_likes = likes.pending(payloads)
+    return render_post_payloads(posts, payloads, request, pending_likes)
+
+
+def profile_payload(profile) -> dict:
+    """Return serialized profile detail from the cache."""
+    key = PROFILE_KEY.format(
+        id=profile.pk, version=profile.updated_at.timestamp()
+    )
+    payload = cache.get(key)
+    _count(
+        "profile", hits=int(payload is not None), misses=int(payload is None)
+    )
+    if payload is None:
+        payload = dict(ProfileDetailSerializer(profile).data)
+        cache.set(key, payload, settings.PAYLOAD_CACHE_TIMEOUT)
+    return payload
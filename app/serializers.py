@@ -1,4 +1,7 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.conf import settings
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
 from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
@@ -6,8 +9,9 @@ from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 from rest_framework.validators import UniqueValidator
 
+from app import autocomplete, graph, images, likes, trending
 from app.models import *
-from app.tasks import publish_post
+from app.tasks import fan_out_post
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -84,6 +88,10 @@ class LogoutSerializer(serializers.Serializer):
     pass
 
 
+class TokenSerializer(serializers.Serializer):
+    token = serializers.CharField(read_only=True)
+
+
 class ProfileCreateSerializer(serializers.ModelSerializer):
     """Profile create Serializer"""
 
@@ -203,24 +211,43 @@ class FollowersSerializer(serializers.ModelSerializer):
         fields = ("id", "follower")
 
 
-class MyFollowingSerializer(serializers.ModelSerializer):
-    """My Following Serializer"""
-
-    following = serializers.StringRelatedField(many=True, read_only=True)
+class GraphUserSerializer(serializers.ModelSerializer):
+    """User with follow counters, item of follower and following lists"""
 
     class Meta:
         model = get_user_model()
-        fields = ("following",)
+        fields = ("id", "username", "followers_count", "following_count")
+
+
+class GraphUserDetailSerializer(GraphUserSerializer):
+    """User follow counters and relation to the request user"""
+
+    is_following = serializers.SerializerMethodField()
+    is_followed_by = serializers.SerializerMethodField()
+
+    class Meta(GraphUserSerializer.Meta):
+        fields = GraphUserSerializer.Meta.fields + (
+            "is_following",
+            "is_followed_by",
+        )
+
+    def get_is_following(self, obj) -> bool:
+        """Whether the request user follows this user"""
+        return graph.is_following(self.context["request"].user.id, obj.id)
 
+    def get_is_followed_by(self, obj) -> bool:
+        """Whether this user follows the request user"""
+        return graph.is_following(obj.id, self.context["request"].user.id)
 
-class MyFollowersSerializer(serializers.ModelSerializer):
-    """MyFollowers Serializer"""
 
-    followers = serializers.StringRelatedField(many=True, read_only=True)
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    """Suggested user with the score of the suggestion"""
+
+    suggested = GraphUserSerializer(read_only=True)
 
     class Meta:
-        model = get_user_model()
-        fields = ("followers",)
+        model = FollowSuggestion
+        fields = ("suggested", "score")
 
 
 class ImageCreateSerializer(serializers.ModelSerializer):
@@ -231,6 +258,7 @@ class ImageCreateSerializer(serializers.ModelSerializer):
         fields = (
             "post",
             "picture",
+            "status",
         )
 
     def validate(self, data):
@@ -242,16 +270,83 @@ class ImageCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class UploadSerializer(serializers.ModelSerializer):
+    """Resumable upload Serializer, the file is sent in chunks afterwards"""
+
+    owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+    class Meta:
+        model = Upload
+        fields = (
+            "id",
+            "owner",
+            "post",
+            "filename",
+            "size",
+            "offset",
+            "created_at",
+        )
+
+    def validate_filename(self, value):
+        validate_image_file_extension(File(None, name=value))
+        return value
+
+    def validate_size(self, value):
+        if value < 1:
+            raise serializers.ValidationError("The file must not be empty.")
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Ensure the file is at most "
+                f"{settings.CHUNKED_UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
+
+    def validate(self, data):
+        if data["owner"] != data["post"].author:
+            raise serializers.ValidationError(
+                {"post": "You are not the author of this post."}
+            )
+        return data
+
+
 class ImageSerializer(serializers.Serializer):
-    """Image Serializer, uses in AllPostsListSerializer"""
+    """Image Serializer, uses in AllPostsListSerializer. The original
+    picture is available at once, renditions when the status is ready."""
 
     picture = serializers.ImageField()
+    status = serializers.CharField(read_only=True)
+    renditions = serializers.SerializerMethodField()
+
+    def get_renditions(self, obj) -> dict:
+        return images.urls(obj.renditions)
 
 
 class HashtagSerializer(serializers.Serializer):
     """Hashtag Serializer"""
 
+    text = serializers.CharField(max_length=100)
+
+    def validate_text(self, value):
+        value = Hashtag.normalize(value)
+        if not value:
+            raise serializers.ValidationError("Enter a valid hashtag.")
+        return value
+
+
+class HashtagUsesSerializer(serializers.Serializer):
+    """Hashtag with the number of its uses, trending and autocomplete"""
+
     text = serializers.CharField()
+    uses = serializers.IntegerField()
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """Post list Serializer, reads pending likes of a page at once"""
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, "all") else data)
+        self.child.pending_likes = likes.pending(post.id for post in posts)
+        return super().to_representation(posts)
 
 
 class AllPostsListSerializer(serializers.ModelSerializer):
@@ -267,7 +362,24 @@ class AllPostsListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ("id", "author", "content", "hashtags", "images")
+        fields = (
+            "id",
+            "author",
+            "content",
+            "hashtags",
+            "images",
+            "like_count",
+            "comment_count",
+        )
+        list_serializer_class = PostListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        pending_likes = getattr(self, "pending_likes", None)
+        if pending_likes is None:
+            pending_likes = likes.pending([instance.id])
+        data["like_count"] += pending_likes.get(instance.id, 0)
+        return data
 
 
 class PostCreateSerializer(serializers.ModelSerializer):
@@ -293,21 +405,21 @@ class PostCreateSerializer(serializers.ModelSerializer):
         with transaction.atomic():
             image_data = validated_data.pop("images", [])
             hashtags_data = validated_data.pop("hashtags", [])
-            is_published = validated_data.get("is_published")
-            time_to_publicate = validated_data.get("time_to_publicate")
             post = Post.objects.create(**validated_data)
             if image_data:
                 Image.objects.create(post=post, picture=image_data)
             if hashtags_data:
-                for hashtag_data in hashtags_data:
-                    hashtag, created = Hashtag.objects.get_or_create(
-                        text=hashtag_data["text"]
-                    )
-                    post.hashtags.add(hashtag)
-            if is_published is False and time_to_publicate:
-                publish_post.apply_async(
-                    (post.id,), eta=post.time_to_publicate
+                hashtags = Hashtag.resolve(
+                    hashtag_data["text"] for hashtag_data in hashtags_data
                 )
+                post.hashtags.add(*hashtags.values())
+                if post.is_published:
+                    trending.record(hashtags.values())
+                    autocomplete.record(hashtags.values())
+            # scheduled posts are published, their hashtags counted by
+            # `publish_scheduled_posts`
+            if post.is_published:
+                transaction.on_commit(lambda: fan_out_post.delay(post.id))
             return post
 
     def validate_hashtags(self, value):
@@ -325,6 +437,21 @@ class PostCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class PostBulkSerializer(PostCreateSerializer):
+    """Item of bulk post creation, images are uploaded separately"""
+
+    author = None
+    images = None
+
+    class Meta(PostCreateSerializer.Meta):
+        fields = (
+            "content",
+            "hashtags",
+            "is_published",
+            "time_to_publicate",
+        )
+
+
 class MyFollowingPostsListSerializer(serializers.ModelSerializer):
     """Post Serializer"""
 
@@ -353,6 +480,13 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         super().__init__(*args, **kwargs)
         self.fields["post"].default = self.context.get("post")
 
+    def create(self, validated_data):
+        """Create comment and increment comment counter of the post"""
+        with transaction.atomic():
+            comment = super().create(validated_data)
+            Post.update_counters(comment.post_id, comments=1)
+            return comment
+
     def validate(self, attrs):
         data = super(CommentCreateSerializer, self).validate(attrs)
         reviewer = data.get("reviewer")
@@ -381,7 +515,29 @@ class CommentListSerializer(serializers.ModelSerializer):
         fields = ("id", "reviewer", "content", "post")
 
 
-class LikeCreateSerializer(serializers.ModelSerializer):
+class LikeCountersMixin:
+    """Keep `Post.like_count` in sync with created and updated likes."""
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            like = super().create(validated_data)
+            likes.record(like.post_id, int(like.is_likes))
+            return like
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            # concurrent toggles of the like must see each other's state
+            was_liked = (
+                Like.objects.select_for_update()
+                .values_list("is_likes", flat=True)
+                .get(pk=instance.pk)
+            )
+            like = super().update(instance, validated_data)
+            likes.record(like.post_id, int(like.is_likes) - int(was_liked))
+            return like
+
+
+class LikeCreateSerializer(LikeCountersMixin, serializers.ModelSerializer):
     reviewer = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
     )
@@ -399,7 +555,7 @@ class LikeListSerializer(serializers.ModelSerializer):
         fields = ("post", "reviewer", "is_likes")
 
 
-class LikeUpdateSerializer(serializers.ModelSerializer):
+class LikeUpdateSerializer(LikeCountersMixin, serializers.ModelSerializer):
     """Like update Serializer"""
 
     class Meta:
@@ -408,7 +564,9 @@ class LikeUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ("reviewer", "post")
 
 
-class LikePostExtraActionSerializer(serializers.ModelSerializer):
+class LikePostExtraActionSerializer(
+    LikeCountersMixin, serializers.ModelSerializer
+):
     """Like post serialiser for extra action"""
 
     reviewer = serializers.HiddenField(
@@ -426,7 +584,7 @@ class LikePostExtraActionSerializer(serializers.ModelSerializer):
         self.fields["post"].default = self.context.get("post")
 
     def validate(self, attrs):
-        data = super(LikePostSerializer, self).validate(attrs)
+        data = super(LikePostExtraActionSerializer, self).validate(attrs)
         reviewer = data.get("reviewer")
         post = data.get("post")
         Like.validate_like(
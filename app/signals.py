@@ -0,0 +1,149 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Now
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from app import authentication, metrics
+
+from app.models import Blob, Hashtag, Image, Post, Profile, User
+from app.tasks import process_image
+
+
+def touch_posts(post_ids) -> None:
+    """Move cached payloads and conditional GET validators to a new
+    version of the posts."""
+    Post.objects.filter(pk__in=list(post_ids)).update(updated_at=Now())
+
+
+def touch_profiles(profile_ids) -> None:
+    Profile.objects.filter(pk__in=list(profile_ids)).update(updated_at=Now())
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def invalidate_image_post(sender, instance, **kwargs):
+    touch_posts([instance.post_id])
+
+
+@receiver(post_save, sender=Image)
+def queue_image_processing(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: process_image.delay(instance.pk))
+
+
+@receiver(pre_save, sender=Image)
+@receiver(pre_save, sender=Profile)
+def remember_picture(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        instance._old_picture = ""
+    elif update_fields is not None and "picture" not in update_fields:
+        instance._old_picture = instance.picture.name or ""
+    else:
+        instance._old_picture = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("picture", flat=True)
+            .first()
+            or ""
+        )
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=Profile)
+def count_picture_references(sender, instance, **kwargs):
+    old_picture = getattr(instance, "_old_picture", "")
+    picture = instance.picture.name or ""
+    if picture == old_picture:
+        return
+    if picture:
+        Blob.acquire(picture)
+    if old_picture:
+        Blob.release(old_picture)
+
+
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=Profile)
+def release_picture(sender, instance, **kwargs):
+    if instance.picture.name:
+        Blob.release(instance.picture.name)
+
+
+@receiver(m2m_changed, sender=Post.hashtags.through)
+def invalidate_post_hashtags(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        touch_posts([instance.pk])
+    elif pk_set:
+        touch_posts(pk_set)
+    else:
+        touch_posts(instance.posts.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """Deactivation and changed user data apply to the next request."""
+    if created or update_fields == frozenset({"last_login"}):
+        return
+    authentication.invalidate(
+        Token.objects.filter(user_id=instance.pk).values_list("key", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    authentication.invalidate([instance.key])
+
+
+@receiver(post_save, sender=Hashtag)
+def invalidate_hashtag_posts(sender, instance, created, **kwargs):
+    if not created:
+        touch_posts(instance.posts.values_list("id", flat=True))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and "username" not in update_fields
+    ):
+        instance._old_username = instance.username
+        return
+    instance._old_username = (
+        User.objects.filter(pk=instance.pk)
+        .values_list("username", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_payloads(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """Profile payload shows user data, post payloads show the username."""
+    if created or update_fields == frozenset({"last_login"}):
+        return
+    touch_profiles(
+        Profile.objects.filter(user_id=instance.pk).values_list(
+            "id", flat=True
+        )
+    )
+    if (
+        getattr(instance, "_old_username", instance.username)
+        != instance.username
+    ):
+        touch_posts(instance.posts.values_list("id", flat=True))
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    metrics.record_connection()
@@ -0,0 +1,48 @@
+"""Content addressed storage of uploaded pictures."""
+
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the SHA-256 of their content.
+
+    Saving content that is already stored skips the write and returns the
+    name of the stored file. Files are shared, their references are counted
+    by `app.models.Blob`. The blob row is locked and touched before the
+    file is looked up, so garbage collection either removed the file
+    already or leaves the blob alone for its grace period.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        sha = digest.hexdigest()
+        name = posixpath.join(
+            posixpath.dirname(name),
+            sha[:2],
+            sha[2:4],
+            sha + posixpath.splitext(name)[1].lower(),
+        )
+        from app.models import Blob
+
+        with transaction.atomic():
+            blob, created = Blob.objects.select_for_update().get_or_create(
+                name=name
+            )
+            if not created:
+                blob.save(update_fields=["updated_at"])
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)
+
+
+blob_storage = ContentAddressedStorage()
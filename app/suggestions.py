@@ -0,0 +1,156 @@
+"""Friend of friend follow suggestions computed offline.
+
+The follow graph is loaded from the `Follow` table into CSR arrays: users
+get dense indices and `indices[indptr[i]:indptr[i + 1]]` are the users
+followed by user `i`. Hashtags users posted with are loaded the same way.
+Candidates of a user are the users followed by the users they follow,
+scored by the number of such paths. The best path scored candidates get
+`SUGGESTIONS_HASHTAG_WEIGHT` more per hashtag both users have posted
+with, and the `SUGGESTIONS_SIZE` best of them replace the stored
+suggestions of the user. Users are scored `SUGGESTIONS_BATCH_SIZE` at a
+time, so memory is bounded by the two hop neighbourhood of a batch.
+"""
+
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import Follow, FollowSuggestion, Post
+
+LOAD_BATCH_SIZE = 100000
+# candidates per user ranked by hashtag affinity, as a multiple of size
+CANDIDATES_FACTOR = 4
+
+
+def _pairs(queryset, *fields) -> tuple:
+    """Load pairs of ids into two arrays without building model rows."""
+    rows = queryset.values_list(*fields).iterator(chunk_size=LOAD_BATCH_SIZE)
+    chunks = []
+    while chunk := list(islice(rows, LOAD_BATCH_SIZE)):
+        chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    pairs = np.concatenate(chunks)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _csr(sources, targets, size: int) -> tuple:
+    """Return indptr and indices of edges between dense indices."""
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+
+def _expand(csr, rows) -> tuple:
+    """Return neighbours of every row with positions of their rows."""
+    indptr, indices = csr
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    owners = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    return owners, indices[np.repeat(starts, lengths) + offsets]
+
+
+def _top(owners, scores, size: int):
+    """Return positions of the `size` best scores of every owner."""
+    order = np.lexsort((-scores, owners))
+    owners = owners[order]
+    rank = np.arange(len(owners)) - np.searchsorted(owners, owners)
+    return order[rank < size]
+
+
+def _shared(tags, left, right):
+    """Return the number of hashtags used by both users of every pair."""
+    width = int(tags[1].max(initial=0)) + 1
+    left_pairs, left_tags = _expand(tags, left)
+    right_pairs, right_tags = _expand(tags, right)
+    keys, counts = np.unique(
+        np.concatenate(
+            [left_pairs * width + left_tags, right_pairs * width + right_tags]
+        ),
+        return_counts=True,
+    )
+    return np.bincount(keys[counts > 1] // width, minlength=len(left))
+
+
+def _score(graph, tags, batch, size: int) -> tuple:
+    """Return users, suggested users and scores of the batch."""
+    width = len(graph[0]) - 1
+    owners, followed = _expand(graph, batch)
+    via, candidates = _expand(graph, followed)
+    keys, paths = np.unique(
+        owners[via] * width + candidates, return_counts=True
+    )
+    # users themselves and users they already follow are not suggested
+    known = np.concatenate(
+        [owners * width + followed, np.arange(len(batch)) * width + batch]
+    )
+    new = ~np.isin(keys, known)
+    owners, candidates = np.divmod(keys[new], width)
+    scores = paths[new].astype(np.float64)
+
+    best = _top(owners, scores, size * CANDIDATES_FACTOR)
+    owners, candidates, scores = owners[best], candidates[best], scores[best]
+    scores += settings.SUGGESTIONS_HASHTAG_WEIGHT * _shared(
+        tags, batch[owners], candidates
+    )
+    best = _top(owners, scores, size)
+    return batch[owners[best]], candidates[best], scores[best]
+
+
+def compute() -> int:
+    """Replace suggestions of all users, return the number stored."""
+    started = timezone.now()
+    followers, followees = _pairs(
+        Follow.objects.order_by(), "follower_id", "followee_id"
+    )
+    authors, hashtags = _pairs(
+        Post.hashtags.through.objects.filter(post__is_published=True)
+        .order_by()
+        .distinct(),
+        "post__author_id",
+        "hashtag_id",
+    )
+    ids = np.unique(np.concatenate([followers, followees, authors]))
+    graph = _csr(
+        np.searchsorted(ids, followers),
+        np.searchsorted(ids, followees),
+        len(ids),
+    )
+    _, hashtags = np.unique(hashtags, return_inverse=True)
+    tags = _csr(np.searchsorted(ids, authors), hashtags, len(ids))
+
+    stored = 0
+    active = np.flatnonzero(np.diff(graph[0]))
+    for start in range(0, len(active), settings.SUGGESTIONS_BATCH_SIZE):
+        batch = active[start : start + settings.SUGGESTIONS_BATCH_SIZE]
+        users, suggested, scores = _score(
+            graph, tags, batch, settings.SUGGESTIONS_SIZE
+        )
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(
+                user_id__in=ids[batch].tolist()
+            ).delete()
+            FollowSuggestion.objects.bulk_create(
+                [
+                    FollowSuggestion(
+                        user_id=user_id, suggested_id=suggested_id, score=score
+                    )
+                    for user_id, suggested_id, score in zip(
+                        ids[users].tolist(),
+                        ids[suggested].tolist(),
+                        scores.tolist(),
+                    )
+                ],
+                batch_size=1000,
+            )
+        stored += len(users)
+    # users who stopped following anybody were not in any batch
+    FollowSuggestion.objects.filter(created_at__lt=started).delete()
+    return stored
@@ -1,16 +1,188 @@
+import time
+from datetime import timedelta
+
 from celery import shared_task
-from app.models import Post
+from django.conf import settings
+from django.utils import timezone
+
+from django.db import transaction
+
+from app.models import Blob, Image, Post, Upload
+from app import (
+    autocomplete,
+    images,
+    likes,
+    suggestions,
+    timeline,
+    trending,
+    uploads,
+)
+
+
+def record_hashtags(post_ids) -> None:
+    """Count hashtag uses of just published posts."""
+    used = [
+        link.hashtag
+        for link in Post.hashtags.through.objects.filter(
+            post_id__in=post_ids
+        ).select_related("hashtag")
+    ]
+    trending.record(used)
+    autocomplete.record(used)
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=30)
-def publish_post(post_id):
-    post = Post.objects.get(pk=post_id)
-    if post:
-        post.is_published = True
-        post.save()
+def publish_post(self, post_id):
+    """Publish a post now, kept for tasks queued with an ETA before
+    `publish_scheduled_posts` replaced them."""
+    now = timezone.now()
+    published = Post.objects.filter(pk=post_id, is_published=False).update(
+        is_published=True, created_at=now, updated_at=now
+    )
+    if published:
+        record_hashtags([post_id])
+        fan_out_post.delay(post_id)
     return f"post #{post_id} has been published"
 
 
+@shared_task
+def publish_scheduled_posts():
+    """Publish posts whose time to publicate has come and fan them out."""
+    deadline = time.monotonic() + settings.CELERY_TASK_TIME_LIMIT / 2
+    published = 0
+    while time.monotonic() < deadline:
+        with transaction.atomic():
+            post_ids = Post.publish_due(settings.SCHEDULED_POSTS_BATCH_SIZE)
+            record_hashtags(post_ids)
+        if post_ids:
+            fan_out_posts.delay(post_ids)
+            published += len(post_ids)
+        if len(post_ids) < settings.SCHEDULED_POSTS_BATCH_SIZE:
+            break
+    return f"{published} scheduled posts have been published"
+
+
+@shared_task(max_retries=3, default_retry_delay=30)
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return f"post #{post_id} does not exist"
+    pushed = timeline.push_post(post)
+    return f"post #{post_id} has been pushed to {pushed} timelines"
+
+
+@shared_task(max_retries=3, default_retry_delay=30)
+def fan_out_posts(post_ids):
+    pushed = 0
+    for post in Post.objects.filter(pk__in=post_ids).order_by("id"):
+        pushed += timeline.push_post(post)
+    return f"{len(post_ids)} posts have been pushed to {pushed} timelines"
+
+
+@shared_task(max_retries=3, default_retry_delay=30)
+def fan_out_author(author_id):
+    pushed = timeline.push_author(author_id)
+    return f"posts of user #{author_id} have been pushed as {pushed} entries"
+
+
+@shared_task
+def flush_like_counters():
+    flushed = likes.flush()
+    return f"like counters of {flushed} posts have been flushed"
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def process_image(self, image_id):
+    image = Image.objects.filter(pk=image_id).first()
+    if image is None:
+        return f"image #{image_id} does not exist"
+    image.status = Image.Status.PROCESSING
+    image.save(update_fields=["status"])
+    try:
+        # images sharing the picture wait for the first one and reuse it
+        with transaction.atomic():
+            blob, _ = Blob.objects.select_for_update().get_or_create(
+                name=image.picture.name
+            )
+            if not blob.renditions:
+                blob.renditions = images.render(image)
+                blob.save(update_fields=["renditions", "updated_at"])
+    except Exception as exc:
+        # I/O errors are retried, others (undecodable pictures,
+        # DecompressionBombError) would fail the same way again
+        if (
+            isinstance(exc, OSError)
+            and self.request.retries < self.max_retries
+        ):
+            raise self.retry(exc=exc)
+        image.status = Image.Status.FAILED
+        image.save(update_fields=["status"])
+        return f"image #{image_id} processing has failed: {exc}"
+    image.renditions = blob.renditions
+    image.status = Image.Status.READY
+    image.save(update_fields=["status", "renditions"])
+    return f"image #{image_id} has {len(image.renditions)} renditions"
+
+
+@shared_task
+def refresh_trending_hashtags():
+    trending.refresh()
+    return "trending hashtags have been refreshed"
+
+
+@shared_task
+def rebuild_hashtag_autocomplete():
+    count = autocomplete.rebuild()
+    return f"autocomplete index of {count} hashtags has been rebuilt"
+
+
+@shared_task
+def expire_uploads():
+    expired = Upload.objects.filter(
+        updated_at__lt=timezone.now()
+        - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRE)
+    )
+    count = 0
+    for upload in expired.iterator():
+        uploads.discard(upload)
+        upload.delete()
+        count += 1
+    return f"{count} stale uploads have been removed"
+
+
+@shared_task
+def collect_blobs():
+    """Remove files of pictures no image or profile refers to anymore."""
+    unused = Blob.objects.filter(
+        ref_count=0,
+        updated_at__lt=timezone.now()
+        - timedelta(seconds=settings.BLOB_GC_GRACE),
+    )
+    collected = 0
+    for blob_id in list(unused.values_list("id", flat=True)):
+        with transaction.atomic():
+            blob = (
+                unused.select_for_update(skip_locked=True)
+                .filter(pk=blob_id)
+                .first()
+            )
+            if blob is None:
+                continue
+            # files go while the row is locked, storage saving the same
+            # content waits and writes them again
+            Image.picture.field.storage.delete(blob.name)
+            images.delete(blob.renditions)
+            blob.delete()
+        collected += 1
+    return f"{collected} unused blobs have been collected"
+
+
+@shared_task(time_limit=settings.SUGGESTIONS_TIME_LIMIT)
+def compute_follow_suggestions():
+    stored = suggestions.compute()
+    return f"{stored} follow suggestions have been computed"
+
+
 #  docker run -d -p 6379:6379 redis
 
 # celery -A api_config worker --loglevel=INFO --pool=solo
@@ -1,3 +1,720 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Now
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image as PILImage
+from redis import RedisError
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from app import (
+    authentication,
+    autocomplete,
+    graph,
+    likes,
+    payloads,
+    tasks,
+    timeline,
+    trending,
+    uploads,
+)
+from app.models import (
+    Comment,
+    Follow,
+    FollowSuggestion,
+    Hashtag,
+    Image,
+    Like,
+    Post,
+    Profile,
+    TimelineEntry,
+    Upload,
+)
+from app.pagination import KeysetPagination
+from app.redis_client import get_redis
+from app.views import PostViewSet
+
+
+def create_user(username: str):
+    return get_user_model().objects.create_user(
+        email=f"{username}@example.com",
+        password="test12345!",
+        username=username,
+    )
+
+
+def create_users(count: int) -> list:
+    """Create users with profiles, without hashing passwords."""
+    start = get_user_model().objects.count()
+    users = get_user_model().objects.bulk_create(
+        get_user_model()(
+            email=f"user{index}@example.com", username=f"user{index}"
+        )
+        for index in range(start, start + count)
+    )
+    for user in users:
+        Profile.objects.create(user=user, bio="bio")
+    return users
+
+
+def create_posts(author, count: int) -> list:
+    """Create published posts with hashtags and an image each."""
+    hashtags = [
+        Hashtag.objects.get_or_create(text=text)[0]
+        for text in ("django", "python")
+    ]
+    posts = []
+    for index in range(count):
+        post = Post.objects.create(author=author, content=f"post {index}")
+        post.hashtags.add(*hashtags)
+        Image.objects.create(post=post, picture="blobs/test.png")
+        posts.append(post)
+    return posts
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class MyPostsTests(ApiTestCase):
+    def test_my_posts_lists_scheduled_posts(self):
+        published = Post.objects.create(author=self.user, content="now")
+        scheduled = Post.objects.create(
+            author=self.user,
+            content="later",
+            is_published=False,
+            time_to_publicate=timezone.now() + timedelta(days=1),
+        )
+
+        response = self.client.get("/api/post/my_posts/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [scheduled.id, published.id],
+        )
+
+
+class CursorPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [
+            Post.objects.create(author=self.user, content=f"post {index}")
+            for index in range(5)
+        ]
+
+    def walk(self, url: str, link: str) -> list:
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(post["id"] for post in response.data["results"])
+            url = response.data[link]
+        return ids
+
+    def test_cursors_walk_all_pages_both_ways(self):
+        newest_first = [post.id for post in reversed(self.posts)]
+
+        self.assertEqual(
+            self.walk("/api/post/?page_size=2", "next"), newest_first
+        )
+        response = self.client.get("/api/post/?page_size=2")
+        last_page = self.client.get(response.data["next"]).data
+        last_page = self.client.get(last_page["next"]).data
+        self.assertEqual(
+            [post["id"] for post in last_page["results"]], newest_first[4:]
+        )
+        previous = self.client.get(last_page["previous"]).data
+        self.assertEqual(
+            [post["id"] for post in previous["results"]], newest_first[2:4]
+        )
+
+    def test_tampered_cursors_are_not_found(self):
+        created_at = self.posts[0].created_at.isoformat()
+        positions = [
+            [created_at, "abc"],
+            [created_at, 1.5],
+            [created_at, True],
+            ["yesterday", 1],
+            ["2024-02-30T00:00:00+00:00", 1],
+            [1, 1],
+            [created_at],
+            "ab",
+        ]
+        cursors = [
+            base64.urlsafe_b64encode(json.dumps({"p": p}).encode()).decode()
+            for p in positions
+        ] + ["not base64!", base64.urlsafe_b64encode(b"[1]").decode()]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/post/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TIMELINE_FANOUT_FOLLOWER_LIMIT=1)
+class TimelineTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        get_redis().flushdb()
+        self.author = create_user("author")
+        self.other = create_user("other")
+        for user in (self.user, self.other):
+            self.follow(user)
+
+    def follow(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post("/api/follow/", {"followee": self.author.id})
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def timeline(self) -> list:
+        response = self.client.get("/api/post/my_following/")
+        return [post["id"] for post in response.data["results"]]
+
+    def test_recent_posts_of_pulled_author_are_all_kept(self):
+        posts = [
+            Post.objects.create(author=self.author, content=f"post {index}")
+            for index in range(3)
+        ]
+        for post in posts:
+            timeline.push_post(post)
+
+        self.assertEqual(self.timeline(), [post.id for post in posts[::-1]])
+
+    def test_posts_made_while_pulled_are_fanned_out_later(self):
+        post = Post.objects.create(author=self.author, content="pulled")
+        self.assertEqual(timeline.push_post(post), 0)
+        self.assertEqual(self.timeline(), [post.id])
+
+        follow = Follow.objects.get(follower=self.other, followee=self.author)
+        client = APIClient()
+        client.force_authenticate(self.other)
+        with mock.patch.object(
+            tasks.fan_out_author, "delay", side_effect=tasks.fan_out_author
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = client.delete(f"/api/follow/{follow.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(
+            TimelineEntry.objects.filter(owner=self.user, post=post).exists()
+        )
+        self.assertEqual(self.timeline(), [post.id])
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = create_user("reader")
+        self.followees = [
+            create_user(f"followee{index}") for index in range(2)
+        ]
+        Follow.objects.create(follower=self.user, followee=self.followees[0])
+
+    def test_follow_committed_during_load_is_kept(self):
+        fill = graph._fill
+
+        def follow_meanwhile(redis, key, edges, ttl):
+            fill(redis, key, edges, ttl)
+            if not Follow.objects.filter(followee=self.followees[1]).exists():
+                graph._update(
+                    Follow.objects.create(
+                        follower=self.user, followee=self.followees[1]
+                    ),
+                    "add",
+                )
+
+        with mock.patch.object(graph, "_fill", follow_meanwhile):
+            key = graph.following_key(self.user.id)
+
+        for followee in self.followees:
+            self.assertTrue(graph.is_following(self.user.id, followee.id))
+        self.assertGreater(get_redis().ttl(key), graph.STALE_TTL)
+
+    def test_set_changing_on_every_load_expires_soon(self):
+        fill = graph._fill
+
+        def unfollow_meanwhile(redis, key, edges, ttl):
+            fill(redis, key, edges, ttl)
+            graph._update(Follow.objects.first(), "remove")
+
+        with mock.patch.object(graph, "_fill", unfollow_meanwhile):
+            key = graph.following_key(self.user.id)
+
+        self.assertLessEqual(get_redis().ttl(key), graph.STALE_TTL)
+
+
+class ConditionalGetTests(ApiTestCase):
+    def test_list_validators_notice_removed_posts(self):
+        Post.objects.create(author=self.user, content="old")
+        newest = Post.objects.create(author=self.user, content="new")
+        removed = Post.objects.create(author=self.user, content="gone")
+        Post.objects.filter(pk=newest.pk).update(updated_at=timezone.now())
+
+        response = self.client.get("/api/post/")
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+        removed.delete()
+
+        response = self.client.get("/api/post/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class PostValidatorTests(ApiTestCase):
+    def test_etag_follows_counters_not_updated_at(self):
+        post = Post.objects.create(author=self.user, content="post")
+        response = self.client.get(f"/api/post/{post.id}/")
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        response = self.client.get(
+            f"/api/post/{post.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.filter(pk=post.pk).update(like_count=1)
+        response = self.client.get(
+            f"/api/post/{post.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["like_count"], 1)
+
+
+class PayloadCacheTests(ApiTestCase):
+    def test_counters_keep_cached_payload(self):
+        post = create_posts(self.user, 1)[0]
+        self.client.get(f"/api/post/{post.id}/")
+        updated_at = Post.objects.get(pk=post.pk).updated_at
+
+        Post.update_counters(post.id, likes=1, comments=1)
+
+        self.assertEqual(Post.objects.get(pk=post.pk).updated_at, updated_at)
+        with mock.patch.object(payloads, "serialize_posts") as serialize:
+            response = self.client.get(f"/api/post/{post.id}/")
+        serialize.assert_not_called()
+        self.assertEqual(response.data["like_count"], 1)
+        self.assertEqual(response.data["comment_count"], 1)
+
+
+class ScheduledPostsTests(ApiTestCase):
+    def test_published_post_is_ordered_by_publication_time(self):
+        scheduled = Post.objects.create(
+            author=self.user,
+            content="scheduled",
+            is_published=False,
+            time_to_publicate=timezone.now() + timedelta(days=1),
+        )
+        published = Post.objects.create(author=self.user, content="now")
+        Post.objects.filter(pk=published.pk).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        Post.objects.filter(pk=scheduled.pk).update(
+            created_at=timezone.now() - timedelta(days=1),
+            time_to_publicate=timezone.now() - timedelta(minutes=1),
+        )
+
+        self.assertEqual(Post.publish_due(10), [scheduled.id])
+
+        response = self.client.get("/api/post/")
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [scheduled.id, published.id],
+        )
+
+    def test_hashtags_are_counted_when_published(self):
+        get_redis().flushdb()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/post/",
+                {
+                    "content": "scheduled",
+                    "hashtags": [{"text": "django"}],
+                    "is_published": False,
+                    "time_to_publicate": timezone.now() + timedelta(days=1),
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        hashtag = Hashtag.objects.get(text="django")
+        self.assertIsNone(
+            get_redis().zscore(trending._bucket_key(trending.HOUR), hashtag.id)
+        )
+        self.assertEqual(autocomplete.suggest("dj", 10), [])
+
+        Post.objects.filter(pk=response.data["id"]).update(
+            time_to_publicate=timezone.now() - timedelta(minutes=1)
+        )
+        with mock.patch.object(tasks.fan_out_posts, "delay"):
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.publish_scheduled_posts()
+
+        self.assertEqual(
+            get_redis().zscore(
+                trending._bucket_key(trending.HOUR), hashtag.id
+            ),
+            1,
+        )
+        self.assertEqual(autocomplete.suggest("dj", 10), [("django", 1)])
+
+
+class UploadTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CHUNKED_UPLOAD_DIR=directory.name))
+        self.post = Post.objects.create(author=self.user, content="post")
+
+    def create_upload(self, content: bytes) -> Upload:
+        upload = Upload.objects.create(
+            owner=self.user,
+            post=self.post,
+            filename="image.png",
+            size=len(content),
+            offset=len(content),
+        )
+        uploads.part_path(upload).write_bytes(content)
+        return upload
+
+    def finalize(self, upload: Upload):
+        return self.client.post(f"/api/upload/{upload.pk}/finalize/")
+
+    def test_empty_upload_is_rejected(self):
+        response = self.client.post(
+            "/api/upload/",
+            {"post": self.post.id, "filename": "image.png", "size": 0},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("size", response.data)
+
+    def test_missing_part_file_is_reported(self):
+        upload = self.create_upload(b"data")
+        uploads.discard(upload)
+
+        response = self.finalize(upload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Upload.objects.filter(pk=upload.pk).exists())
+
+    def test_decompression_bomb_is_rejected(self):
+        content = io.BytesIO()
+        PILImage.new("RGB", (100, 100)).save(content, "PNG")
+        upload = self.create_upload(content.getvalue())
+
+        with mock.patch.object(PILImage, "MAX_IMAGE_PIXELS", 10):
+            response = self.finalize(upload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.post.images.exists())
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        patcher = mock.patch.dict(
+            api_settings.DEFAULT_THROTTLE_RATES, login="2/min"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, **headers):
+        return APIClient().post(
+            "/api/login/",
+            {"email": "nobody@example.com", "password": "wrong"},
+            **headers,
+        )
+
+    def test_bucket_is_emptied_and_reported(self):
+        responses = [self.login() for _ in range(3)]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [400, 400, 429],
+        )
+        self.assertEqual(
+            [response["RateLimit-Remaining"] for response in responses],
+            ["1", "0", "0"],
+        )
+        # tokens refill while the requests run, seconds are rounded up
+        for response, reset in zip(responses, (30, 60, 60)):
+            self.assertEqual(response["RateLimit-Limit"], "2")
+            self.assertAlmostEqual(
+                int(response["RateLimit-Reset"]), reset, delta=2
+            )
+        self.assertAlmostEqual(int(responses[-1]["Retry-After"]), 30, delta=2)
+
+    def test_forwarded_for_does_not_give_a_new_bucket(self):
+        responses = [
+            self.login(HTTP_X_FORWARDED_FOR=f"10.0.0.{index}")
+            for index in range(3)
+        ]
+
+        self.assertEqual(responses[-1].status_code, 429)
+
+
+@override_settings(LIKE_COUNTER_BUFFERED=True)
+class LikeFlushTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.post = create_posts(create_user("author"), 1)[0]
+        get_redis().hset(likes.PENDING_KEY, self.post.id, 3)
+
+    def assertLikes(self, count: int):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, count)
+
+    def test_flush_applies_pending_deltas_once(self):
+        self.assertEqual(likes.flush(), 1)
+        self.assertEqual(likes.flush(), 0)
+
+        self.assertLikes(3)
+        self.assertEqual(likes.pending([self.post.id]), {})
+
+    def test_batch_applied_before_a_crash_is_not_applied_again(self):
+        redis = get_redis()
+        apply = likes._apply
+
+        def crash(*args):
+            apply(*args)
+            raise RuntimeError("worker lost after commit")
+
+        with mock.patch.object(likes, "_apply", crash), self.assertRaises(
+            RuntimeError
+        ):
+            likes.flush()
+        self.assertTrue(redis.exists(likes.FLUSHING_KEY))
+        self.assertLikes(3)
+        self.assertEqual(likes.pending([self.post.id]), {})
+
+        self.assertEqual(likes.flush(), 0)
+        self.assertLikes(3)
+        self.assertFalse(redis.exists(likes.FLUSHING_KEY))
+
+
+# the default cache, backing payloads and metrics, without a server
+REDIS_DOWN = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:1/0",
+    }
+}
+
+
+@override_settings(CACHES=REDIS_DOWN)
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.token = Token.objects.create(user=create_user("reader"))
+        self.redis = mock.Mock()
+        self.redis.get.side_effect = RedisError
+        self.async_redis = mock.AsyncMock()
+        self.async_redis.get.side_effect = RedisError
+        patcher = mock.patch.multiple(
+            authentication,
+            get_redis=mock.Mock(return_value=self.redis),
+            get_async_redis=mock.Mock(return_value=self.async_redis),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_is_checked_in_database_without_redis(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        response = client.get("/api/following/")
+
+        self.assertEqual(response.status_code, 200)
+        self.redis.set.assert_not_called()
+
+    def test_async_token_is_checked_in_database_without_redis(self):
+        snapshot = async_to_sync(authentication._asnapshot)(self.token.key)
+
+        self.assertEqual(snapshot["id"], self.token.user_id)
+        self.async_redis.set.assert_not_called()
+
+
+@skipUnless(connection.vendor == "postgresql", "Partial indexes of Postgres")
+class QueryPlanTests(TestCase):
+    """Main post queries must keep using their partial indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = get_user_model().objects.bulk_create(
+            get_user_model()(
+                email=f"author{index}@example.com", username=f"author{index}"
+            )
+            for index in range(20)
+        )
+        later = timezone.now() + timedelta(days=1)
+        Post.objects.bulk_create(
+            Post(
+                author=authors[index % len(authors)],
+                content=f"post {index}",
+                is_published=index % 20 != 0,
+                time_to_publicate=None if index % 20 else later,
+            )
+            for index in range(5000)
+        )
+        cls.author = authors[0]
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Post._meta.db_table}")
+
+    def assertUsesIndex(self, queryset, index: str):
+        self.assertIn(index, queryset.explain())
+
+    def test_post_list_uses_published_index(self):
+        self.assertUsesIndex(
+            PostViewSet.queryset.order_by(*KeysetPagination.ordering)[:20],
+            "post_published_created_idx",
+        )
+
+    def test_author_posts_use_published_author_index(self):
+        self.assertUsesIndex(
+            Post.published.filter(author=self.author).order_by(
+                *KeysetPagination.ordering
+            )[:20],
+            "post_published_author_idx",
+        )
+
+    def test_due_posts_use_scheduled_index(self):
+        self.assertUsesIndex(
+            Post.objects.filter(
+                is_published=False, time_to_publicate__lte=Now()
+            ).order_by("time_to_publicate")[:1000],
+            "post_scheduled_idx",
+        )
+
+
+class QueryBudgetTests(ApiTestCase):
+    """Endpoints run the same number of queries whatever the page size."""
+
+    def assertQueryBudget(self, url: str, queries: int, populate):
+        for count in (2, 10):
+            populate(count)
+            # payloads are serialized from the database on a cache miss
+            cache.clear()
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_post_list(self):
+        author = create_users(1)[0]
+        self.assertQueryBudget(
+            "/api/post/", 4, lambda count: create_posts(author, count)
+        )
+
+    def test_post_detail(self):
+        post = create_posts(self.user, 1)[0]
+
+        def populate(count):
+            post.hashtags.add(
+                *Hashtag.objects.bulk_create(
+                    Hashtag(text=f"tag{post.hashtags.count() + index}")
+                    for index in range(count)
+                )
+            )
+            for _ in range(count):
+                Image.objects.create(post=post, picture="blobs/test.png")
+
+        self.assertQueryBudget(f"/api/post/{post.id}/", 4, populate)
+
+    def test_my_posts(self):
+        self.assertQueryBudget(
+            "/api/post/my_posts/",
+            4,
+            lambda count: create_posts(self.user, count),
+        )
+
+    def test_my_following_timeline(self):
+        author = create_users(1)[0]
+
+        def populate(count):
+            TimelineEntry.objects.bulk_create(
+                TimelineEntry(
+                    owner=self.user, post=post, created_at=post.created_at
+                )
+                for post in create_posts(author, count)
+            )
+
+        self.assertQueryBudget("/api/post/my_following/", 6, populate)
+
+    def test_liked_posts(self):
+        author = create_users(1)[0]
+
+        def populate(count):
+            Like.objects.bulk_create(
+                Like(post=post, reviewer=self.user, is_likes=True)
+                for post in create_posts(author, count)
+            )
+
+        self.assertQueryBudget("/api/post/liked/", 4, populate)
+
+    def test_comment_list(self):
+        post = create_posts(self.user, 1)[0]
+
+        def populate(count):
+            Comment.objects.bulk_create(
+                Comment(reviewer=reviewer, post=post, content="comment")
+                for reviewer in create_users(count)
+            )
+
+        self.assertQueryBudget("/api/comment/", 1, populate)
+
+    def test_profile_list(self):
+        self.assertQueryBudget("/api/profile/", 1, create_users)
+
+    def test_profile_detail(self):
+        profile = Profile.objects.create(user=self.user)
+        self.assertQueryBudget(
+            f"/api/profile/{profile.id}/", 1, lambda count: None
+        )
+
+    def test_follow_list(self):
+        def populate(count):
+            Follow.objects.bulk_create(
+                Follow(follower=self.user, followee=user)
+                for user in create_users(count)
+            )
+
+        self.assertQueryBudget("/api/follow/", 1, populate)
+        self.assertQueryBudget("/api/following/", 1, populate)
+        self.assertQueryBudget(
+            f"/api/users/{self.user.id}/following/", 2, populate
+        )
+
+    def test_follower_lists(self):
+        def populate(count):
+            Follow.objects.bulk_create(
+                Follow(follower=user, followee=self.user)
+                for user in create_users(count)
+            )
+
+        self.assertQueryBudget("/api/followers/", 1, populate)
+        self.assertQueryBudget(
+            f"/api/users/{self.user.id}/followers/", 2, populate
+        )
+
+    def test_follow_suggestions(self):
+        def populate(count):
+            FollowSuggestion.objects.bulk_create(
+                FollowSuggestion(user=self.user, suggested=user, score=1.0)
+                for user in create_users(count)
+            )
+
+        self.assertQueryBudget("/api/suggestions/", 1, populate)
@@ -0,0 +1,119 @@
+"""Token bucket throttles kept in Redis.
+
+Every client has a bucket per scope holding up to `num` tokens of the
+scope rate `num/period`, refilled continuously at `num / period` tokens a
+second. A request takes one token or is throttled until one is refilled.
+The bucket is read, refilled and taken from by one Lua script, so a check
+is a single atomic round trip. Authenticated clients are identified by
+user, anonymous ones by IP.
+
+Views choose scopes with `throttle_scope`, or per action with a
+`throttle_scopes` dict. Responses of throttled views carry `RateLimit-*`
+headers of the most limited bucket, throttled responses `Retry-After`.
+"""
+
+import logging
+import math
+
+from django.utils.deprecation import MiddlewareMixin
+from redis import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = "throttle:{scope}:{ident}"
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# returns whether the token was taken, tokens left and seconds until
+# a token and until the bucket is full again
+TAKE_TOKEN = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call(
+    "HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now)
+)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate))
+return {
+    allowed,
+    math.floor(tokens),
+    tostring(math.max(0, 1 - tokens) / rate),
+    tostring((capacity - tokens) / rate),
+}
+"""
+
+
+def parse_rate(rate: str) -> tuple:
+    """Return capacity and tokens per second of a `num/period` rate."""
+    num, period = rate.split("/")
+    return int(num), int(num) / PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle requests of the view action scope with a Redis token
+    bucket."""
+
+    def get_scope(self, view):
+        scopes = getattr(view, "throttle_scopes", {})
+        return scopes.get(
+            getattr(view, "action", None),
+            getattr(view, "throttle_scope", None),
+        )
+
+    def get_ident(self, request) -> str:
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view) -> bool:
+        scope = self.get_scope(view)
+        if scope is None or scope not in api_settings.DEFAULT_THROTTLE_RATES:
+            return True
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        capacity, rate = parse_rate(rates[scope])
+        key = BUCKET_KEY.format(scope=scope, ident=self.get_ident(request))
+        take_token = get_redis().register_script(TAKE_TOKEN)
+        try:
+            allowed, remaining, self.retry_after, reset = take_token(
+                keys=[key], args=[capacity, rate]
+            )
+        except RedisError:
+            logger.exception("Throttle of scope %s is unavailable", scope)
+            return True
+        limit = getattr(request._request, "rate_limit", None)
+        if limit is None or remaining < limit[1]:
+            request._request.rate_limit = (
+                capacity,
+                remaining,
+                math.ceil(float(reset)),
+            )
+        return bool(allowed)
+
+    def wait(self):
+        return math.ceil(float(self.retry_after))
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    """Add `RateLimit-*` headers of throttled views to their responses."""
+
+    def process_response(self, request, response):
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit is not None:
+            limit, remaining, reset = rate_limit
+            response["RateLimit-Limit"] = limit
+            response["RateLimit-Remaining"] = remaining
+            response["RateLimit-Reset"] = reset
+        return response
@@ -0,0 +1,293 @@
+"""Hybrid home timeline built on top of the `Follow` model.
+
+Posts of regular authors are fanned out on write into the `TimelineEntry`
+table of every follower. Authors with more than
+`TIMELINE_FANOUT_FOLLOWER_LIMIT` followers are not fanned out, their recent
+posts are kept in a per-author Redis sorted set and merged into the
+timeline on read. Once such an author falls back to the limit, the posts
+they made meanwhile are fanned out by `push_author`.
+"""
+
+import heapq
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from redis import RedisError
+
+from app import metrics
+from app.models import Follow, Post, TimelineEntry
+from app.pagination import keyset_filter, keyset_ordering
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RECENT_POSTS_KEY = "timeline:recent:{author_id}"
+ENTRY_ORDERING = ("-created_at", "-post_id")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+TimelineItem = namedtuple("TimelineItem", ("created_at", "id"))
+
+metrics.register(
+    "timeline.fanout.posts",
+    "timeline.fanout.entries",
+    "timeline.fanout.duration_ms",
+    "timeline.fanout.pulled_posts",
+)
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def is_pulled(followers_count: int) -> bool:
+    """Whether posts of an author with followers_count are read on pull."""
+    return followers_count > settings.TIMELINE_FANOUT_FOLLOWER_LIMIT
+
+
+def _followers_count(author_id: int) -> int:
+    followers_count = (
+        get_user_model()
+        .objects.filter(pk=author_id)
+        .values_list("followers_count", flat=True)
+        .first()
+    )
+    return followers_count or 0
+
+
+def _recent_posts_from_db(author_id: int) -> list:
+    posts = (
+        Post.published.filter(author_id=author_id)
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id")
+    )
+    return list(posts[: settings.TIMELINE_RECENT_POSTS_SIZE])
+
+
+# recent posts are members of a sorted set scored by exact microseconds
+def _score(created_at: datetime) -> int:
+    return (created_at - EPOCH) // timedelta(microseconds=1)
+
+
+def _created_at(score: float) -> datetime:
+    return EPOCH + timedelta(microseconds=int(score))
+
+
+def _store_recent_posts(pipe, author_id: int, posts) -> None:
+    key = RECENT_POSTS_KEY.format(author_id=author_id)
+    pipe.zadd(
+        key, {post_id: _score(created_at) for created_at, post_id in posts}
+    )
+    pipe.zremrangebyrank(key, 0, -settings.TIMELINE_RECENT_POSTS_SIZE - 1)
+    pipe.expire(key, settings.TIMELINE_RECENT_POSTS_TTL)
+
+
+def _remember_recent_post(post: Post) -> None:
+    key = RECENT_POSTS_KEY.format(author_id=post.author_id)
+    redis = get_redis()
+    try:
+        # adding to the set is atomic, concurrent posts never drop each
+        # other, a missing set is seeded from the database first
+        posts = [(post.created_at, post.id)]
+        if not redis.exists(key):
+            posts += _recent_posts_from_db(post.author_id)
+        pipe = redis.pipeline()
+        _store_recent_posts(pipe, post.author_id, posts)
+        pipe.execute()
+    except RedisError:
+        logger.exception("Recent posts of user #%s are stale", post.author_id)
+
+
+def _recent_posts(author_ids: list) -> list:
+    """Return (created_at, post_id) pairs of recent posts of the authors."""
+    if not author_ids:
+        return []
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for author_id in author_ids:
+            pipe.zrevrange(
+                RECENT_POSTS_KEY.format(author_id=author_id),
+                0,
+                -1,
+                withscores=True,
+            )
+        cached = dict(zip(author_ids, pipe.execute()))
+    except RedisError:
+        logger.exception("Recent posts are read from the database")
+        cached = dict.fromkeys(author_ids, [])
+    recent = []
+    missing = {}
+    for author_id, members in cached.items():
+        if members:
+            recent += [
+                (_created_at(score), int(post_id))
+                for post_id, score in members
+            ]
+        else:
+            missing[author_id] = _recent_posts_from_db(author_id)
+            recent += missing[author_id]
+    missing = {
+        author_id: posts for author_id, posts in missing.items() if posts
+    }
+    if missing:
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for author_id, posts in missing.items():
+                _store_recent_posts(pipe, author_id, posts)
+            pipe.execute()
+        except RedisError:
+            logger.exception("Recent posts could not be cached")
+    return recent
+
+
+def _push(author_id: int, posts) -> int:
+    """Insert (created_at, post_id) posts into the timelines of the author's
+    followers. Return the number of entries."""
+    follower_ids = (
+        Follow.objects.filter(followee_id=author_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    pushed = 0
+    for follower_id in follower_ids:
+        batch.extend(
+            TimelineEntry(
+                owner_id=follower_id, post_id=post_id, created_at=created_at
+            )
+            for created_at, post_id in posts
+        )
+        if len(batch) >= settings.TIMELINE_FANOUT_BATCH_SIZE:
+            _bulk_insert(batch)
+            pushed += len(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+        pushed += len(batch)
+    return pushed
+
+
+def push_post(post: Post) -> int:
+    """Push a published post into the timelines of the author's followers.
+    Return the number of timelines the post was pushed to."""
+    if not post.is_published:
+        return 0
+    started = time.monotonic()
+    if is_pulled(_followers_count(post.author_id)):
+        _remember_recent_post(post)
+        metrics.incr("timeline.fanout.pulled_posts")
+        return 0
+
+    pushed = _push(post.author_id, [(post.created_at, post.id)])
+    duration_ms = (time.monotonic() - started) * 1000
+    metrics.incr("timeline.fanout.posts")
+    metrics.incr("timeline.fanout.entries", pushed)
+    metrics.incr("timeline.fanout.duration_ms", round(duration_ms))
+    logger.info(
+        "post #%s fanned out to %s timelines in %.1f ms",
+        post.id,
+        pushed,
+        duration_ms,
+    )
+    return pushed
+
+
+def push_author(author_id: int) -> int:
+    """Fan out recent posts of an author who is no longer pulled, they were
+    only merged on read while the author was. Return the number of
+    entries."""
+    if is_pulled(_followers_count(author_id)):
+        return 0
+    pushed = _push(author_id, _recent_posts_from_db(author_id))
+    try:
+        get_redis().delete(RECENT_POSTS_KEY.format(author_id=author_id))
+    except RedisError:
+        logger.exception("Recent posts of user #%s are stale", author_id)
+    return pushed
+
+
+def backfill(follower_id: int, followee_id: int) -> None:
+    """Copy the most recent posts of a new followee into follower's timeline"""
+    if is_pulled(_followers_count(followee_id)):
+        return
+    posts = Post.published.filter(author_id=followee_id).order_by(
+        "-created_at", "-id"
+    )[: settings.TIMELINE_BACKFILL_SIZE]
+    _bulk_insert(
+        [
+            TimelineEntry(
+                owner_id=follower_id,
+                post_id=post.id,
+                created_at=post.created_at,
+            )
+            for post in posts.only("id", "created_at")
+        ]
+    )
+
+
+def prune(follower_id: int, followee_id: int) -> None:
+    """Remove posts of an unfollowed user from follower's timeline."""
+    TimelineEntry.objects.filter(
+        owner_id=follower_id, post__author_id=followee_id
+    ).delete()
+
+
+def read(owner_id: int, position=None, reverse=False, limit=None) -> list:
+    """Return a slice of the owner's timeline located after position, merging
+    pushed entries with recent posts of followed pull authors.
+
+    Follows the `KeysetPagination.paginate_source` protocol, items are
+    ordered newest first unless reverse is set.
+    """
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    if position is not None:
+        entries = entries.filter(
+            keyset_filter(ENTRY_ORDERING, position, reverse)
+        )
+    entries = entries.order_by(
+        *keyset_ordering(ENTRY_ORDERING, reverse)
+    ).values_list("created_at", "post_id")
+    if limit is not None:
+        entries = entries[:limit]
+    pushed = [TimelineItem(*entry) for entry in entries]
+
+    pull_author_ids = list(
+        get_user_model()
+        .objects.filter(
+            followers_relation__follower_id=owner_id,
+            followers_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT,
+        )
+        .values_list("id", flat=True)
+    )
+    pulled = [TimelineItem(*item) for item in _recent_posts(pull_author_ids)]
+    if position is not None:
+        position = tuple(position)
+        pulled = [
+            item
+            for item in pulled
+            if (item > position if reverse else item < position)
+        ]
+    pulled.sort(reverse=not reverse)
+
+    items = []
+    seen = set()
+    for item in heapq.merge(pushed, pulled, reverse=not reverse):
+        if item.id not in seen:
+            seen.add(item.id)
+            items.append(item)
+        if limit is not None and len(items) >= limit:
+            break
+    return items
+
+
+def load_posts(post_ids, queryset) -> list:
+    """Return posts with the given ids keeping their order."""
+    posts = queryset.in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -0,0 +1,86 @@
+"""Trending hashtags over sliding windows.
+
+Every use of a hashtag increments its score in the sorted sets of the
+current minute and of the current hour. A periodic task merges the last
+60 minute sets into the hour window and the hourly sets into the longer
+windows, so the last hour slides by the minute instead of restarting at
+every hour boundary. Top hashtags are then served with a single
+ZREVRANGE no matter how many posts were written.
+"""
+
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from app.redis_client import get_redis
+
+MINUTE = 60
+HOUR = 3600
+BUCKET_KEYS = {
+    MINUTE: "trending:minute:{bucket}",
+    HOUR: "trending:hour:{bucket}",
+}
+WINDOW_KEY = "trending:window:{window}"
+# seconds per bucket and number of buckets merged by every window
+WINDOWS = {"1h": (MINUTE, 60), "24h": (HOUR, 24), "7d": (HOUR, 7 * 24)}
+
+
+def _bucket_key(size: int, offset: int = 0) -> str:
+    """Return key of the bucket offset buckets before the current one."""
+    bucket = int(time.time()) // size - offset
+    return BUCKET_KEYS[size].format(bucket=bucket)
+
+
+def _bucket_ttl(size: int) -> int:
+    buckets = max(
+        count for bucket_size, count in WINDOWS.values() if bucket_size == size
+    )
+    return (buckets + 1) * size
+
+
+def record(hashtags) -> None:
+    """Count uses of the hashtags once the transaction commits, a hashtag
+    used by several posts is given once per post. Failures are logged, the
+    post is created anyway."""
+    counts = Counter(hashtag.id for hashtag in hashtags)
+    if not counts:
+        return
+
+    def increment():
+        pipe = get_redis().pipeline(transaction=False)
+        for size in BUCKET_KEYS:
+            key = _bucket_key(size)
+            for hashtag_id, count in counts.items():
+                pipe.zincrby(key, count, hashtag_id)
+            pipe.expire(key, _bucket_ttl(size))
+        pipe.execute()
+
+    transaction.on_commit(increment, robust=True)
+
+
+def refresh() -> None:
+    """Rebuild sorted sets of all windows from their buckets."""
+    redis = get_redis()
+    for window, (size, count) in WINDOWS.items():
+        key = WINDOW_KEY.format(window=window)
+        staging = f"{key}:staging"
+        pipe = redis.pipeline()
+        pipe.zunionstore(
+            staging, [_bucket_key(size, offset) for offset in range(count)]
+        )
+        pipe.zremrangebyrank(staging, 0, -settings.TRENDING_SIZE - 1)
+        pipe.execute()
+        if redis.exists(staging):
+            redis.rename(staging, key)
+        else:
+            redis.delete(key)
+
+
+def top(window: str, limit: int) -> list:
+    """Return (hashtag id, uses) pairs of the most used hashtags."""
+    entries = get_redis().zrevrange(
+        WINDOW_KEY.format(window=window), 0, limit - 1, withscores=True
+    )
+    return [(int(member), int(score)) for member, score in entries]
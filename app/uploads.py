@@ -0,0 +1,88 @@
+"""Resumable chunked uploads of post images.
+
+Chunks are streamed from the request body into a chunk file in
+`CHUNKED_UPLOAD_DIR` block by block, so memory use does not depend on the
+file or chunk size, and no lock is held while a slow client sends it.
+Received chunks are then appended to the partial file of the upload while
+its offset is advanced. Finalizing a complete upload hands the partial
+file to the storage backend as the picture of a new `Image`.
+"""
+
+import shutil
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image as PILImage
+
+from app.models import Image, Upload
+
+BLOCK_SIZE = 64 * 1024
+
+
+def part_path(upload) -> Path:
+    return Path(settings.CHUNKED_UPLOAD_DIR) / f"{upload.pk}.part"
+
+
+def receive_chunk(upload, stream, length: int) -> Path:
+    """Write up to length bytes of stream into a new chunk file of the
+    upload. Return its path."""
+    path = Path(settings.CHUNKED_UPLOAD_DIR) / (
+        f"{upload.pk}.{uuid.uuid4().hex}.chunk"
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, "wb") as chunk:
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            chunk.write(block)
+            written += len(block)
+    return path
+
+
+def append_chunk(upload, chunk: Path, offset: int) -> None:
+    """Write the chunk file at offset of the partial file, the caller
+    holds the upload row lock."""
+    path = part_path(upload)
+    with open(path, "r+b" if path.exists() else "wb") as part:
+        part.seek(offset)
+        with open(chunk, "rb") as data:
+            shutil.copyfileobj(data, part, BLOCK_SIZE)
+        # bytes past the chunk belong to an interrupted append
+        part.truncate()
+
+
+def discard(upload) -> None:
+    part_path(upload).unlink(missing_ok=True)
+
+
+def finalize(upload) -> Image:
+    """Create the post image from a complete upload.
+    Raise ValueError if the uploaded file is missing or not an image and
+    Upload.DoesNotExist if it has already been finalized."""
+    path = part_path(upload)
+    with transaction.atomic():
+        # a concurrent finalize waits here and finds the upload deleted
+        Upload.objects.select_for_update().get(pk=upload.pk)
+        try:
+            part = open(path, "rb")
+        except FileNotFoundError as exc:
+            raise ValueError("The uploaded file is missing.") from exc
+        with part:
+            try:
+                PILImage.open(part).verify()
+            # not only OSError, e.g. DecompressionBombError of huge images
+            except Exception as exc:
+                raise ValueError("Upload a valid image.") from exc
+            part.seek(0)
+            image = Image.objects.create(
+                post_id=upload.post_id,
+                picture=File(part, name=upload.filename),
+            )
+            upload.delete()
+    path.unlink(missing_ok=True)
+    return image
@@ -3,10 +3,18 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken import views
 
+from app.async_views import (
+    AsyncMyFollowingPostsView,
+    AsyncPostListView,
+    AsyncProfileDetailView,
+)
+
 from app.views import (
     CreateUserView,
     LoginUserView,
     LogoutUserView,
+    RotateTokenView,
+    MetricsView,
     ProfileViewSet,
     FollowViewSet,
     FollowersViewSet,
@@ -15,6 +23,10 @@ from app.views import (
     PostViewSet,
     CommentViewSet,
     LikeViewSet,
+    UploadViewSet,
+    HashtagViewSet,
+    UserGraphViewSet,
+    FollowSuggestionViewSet,
 )
 
 app_name = "app"
@@ -27,11 +39,30 @@ router.register(r"followers", MyFollowersSet, basename="followers")
 router.register(r"post", PostViewSet, basename="post")
 router.register(r"comment", CommentViewSet, basename="comment")
 router.register(r"like", LikeViewSet, basename="like")
+router.register(r"upload", UploadViewSet, basename="upload")
+router.register(r"hashtag", HashtagViewSet, basename="hashtag")
+router.register(r"users", UserGraphViewSet, basename="users")
+router.register(
+    r"suggestions", FollowSuggestionViewSet, basename="suggestions"
+)
 
 
 urlpatterns = [
     path("register/", CreateUserView.as_view(), name="user-register"),
     path("login/", LoginUserView.as_view(), name="take-token"),
     path("logout/", LogoutUserView.as_view(), name="logout"),
+    path("token/rotate/", RotateTokenView.as_view(), name="token-rotate"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("async/post/", AsyncPostListView.as_view(), name="async-post-list"),
+    path(
+        "async/post/my_following/",
+        AsyncMyFollowingPostsView.as_view(),
+        name="async-post-my-following",
+    ),
+    path(
+        "async/profile/<int:pk>/",
+        AsyncProfileDetailView.as_view(),
+        name="async-profile-detail",
+    ),
     path("", include(router.urls)),
 ]
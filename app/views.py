@@ -1,8 +1,20 @@
+import logging
 from datetime import datetime
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import Exists, F, FloatField, OuterRef, Q
+from django.db.models.functions import Cast, Greatest, Now
 from django.shortcuts import render, get_object_or_404
 
+from redis import RedisError
 from rest_framework import viewsets, generics, mixins, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
@@ -10,8 +22,8 @@ from rest_framework.views import APIView
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.decorators import action
 
 from drf_spectacular.utils import (
@@ -21,11 +33,27 @@ from drf_spectacular.utils import (
 )
 from drf_spectacular.types import OpenApiTypes
 
+from app import (
+    authentication,
+    autocomplete,
+    graph,
+    ingest,
+    likes,
+    metrics,
+    payloads,
+    timeline,
+    trending,
+    uploads,
+)
+from app.conditional import ConditionalGetMixin
+from app.tasks import fan_out_author
+from app.redis_client import get_redis
 from app.permissions import IsOwnerOrAuthenticatedReadOnly
 from app.serializers import (
     UserSerializer,
     AuthTokenSerializer,
     LogoutSerializer,
+    TokenSerializer,
     ProfileListSerializer,
     ProfileCreateSerializer,
     ProfileDetailSerializer,
@@ -33,8 +61,9 @@ from app.serializers import (
     FollowSerializer,
     FollowListSerializer,
     FollowersSerializer,
-    MyFollowingSerializer,
-    MyFollowersSerializer,
+    GraphUserSerializer,
+    GraphUserDetailSerializer,
+    FollowSuggestionSerializer,
     AllPostsListSerializer,
     PostCreateSerializer,
     MyFollowingPostsListSerializer,
@@ -46,8 +75,23 @@ from app.serializers import (
     LikeListSerializer,
     LikeUpdateSerializer,
     LikePostExtraActionSerializer,
+    UploadSerializer,
+    PostBulkSerializer,
+    HashtagUsesSerializer,
+)
+from app.models import (
+    Profile,
+    Follow,
+    FollowSuggestion,
+    Post,
+    Image,
+    Comment,
+    Like,
+    Upload,
+    Hashtag,
 )
-from app.models import Profile, Follow, Post, Image, Comment, Like
+
+logger = logging.getLogger(__name__)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -55,6 +99,7 @@ class CreateUserView(generics.CreateAPIView):
 
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
+    throttle_scope = "register"
 
 
 class LoginUserView(ObtainAuthToken):
@@ -62,6 +107,14 @@ class LoginUserView(ObtainAuthToken):
 
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
     serializer_class = AuthTokenSerializer
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = "login"
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = authentication.issue(serializer.validated_data["user"])
+        return Response({"token": token.key})
 
 
 class LogoutUserView(APIView):
@@ -74,7 +127,71 @@ class LogoutUserView(APIView):
         return Response({"detail": "Successfully logged out."})
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class RotateTokenView(APIView):
+    """Endpoint for replacing the token of the user with a new one."""
+
+    serializer_class = TokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        token = authentication.rotate(request.user)
+        return Response({"token": token.key})
+
+
+class LivenessView(APIView):
+    """Endpoint answering while the process serves requests."""
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    throttle_classes = ()
+
+    def get(self, request, *args, **kwargs):
+        return Response({"status": "ok"})
+
+
+class ReadinessView(APIView):
+    """Endpoint answering 503 while the database or Redis is unreachable,
+    errors are logged rather than returned."""
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    throttle_classes = ()
+
+    def get(self, request, *args, **kwargs):
+        checks = {}
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            checks["database"] = "ok"
+        except DatabaseError:
+            logger.exception("Database is unavailable")
+            checks["database"] = "unavailable"
+        try:
+            get_redis().ping()
+            checks["redis"] = "ok"
+        except RedisError:
+            logger.exception("Redis is unavailable")
+            checks["redis"] = "unavailable"
+        ready = all(check == "ok" for check in checks.values())
+        return Response(
+            checks,
+            status=(
+                status.HTTP_200_OK
+                if ready
+                else status.HTTP_503_SERVICE_UNAVAILABLE
+            ),
+        )
+
+
+class MetricsView(APIView):
+    """Endpoint for reading application counters."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response({**metrics.snapshot(), **metrics.database_stats()})
+
+
+class ProfileViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Endpoint for working with profile data."""
 
     serializer_class = ProfileCreateSerializer
@@ -119,6 +236,13 @@ class ProfileViewSet(viewsets.ModelViewSet):
                 description="Filter by joined date "
                 "(ex. ?joined=YYYY-MM-DD,YYYY-MM-DD)",
             ),
+            OpenApiParameter(
+                "search",
+                type=OpenApiTypes.STR,
+                description="Typo tolerant search by username, first name "
+                "or last name, results are ranked by similarity "
+                "(ex. ?search=jonh)",
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
@@ -128,7 +252,21 @@ class ProfileViewSet(viewsets.ModelViewSet):
             return Response(
                 {"errors": self.extra_context["errors"]}, status=400
             )
-        return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        return self.get_conditional_response(
+            page,
+            lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ),
+            many=True,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get profile."""
+        profile = self.get_object()
+        return self.get_conditional_response(
+            [profile], lambda: Response(payloads.profile_payload(profile))
+        )
 
     def get_queryset(self):
         """Return queryset for profiles."""
@@ -138,6 +276,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
         first_name = self.request.query_params.get("firstname")
         last_name = self.request.query_params.get("lastname")
         joined = self.request.query_params.get("joined")
+        search = self.request.query_params.get("search")
 
         queryset = self.queryset
 
@@ -159,6 +298,24 @@ class ProfileViewSet(viewsets.ModelViewSet):
         if last_name:
             queryset = queryset.filter(user__last_name__icontains=last_name)
 
+        if search:
+            # `%>` filters use the trigram indexes, similarity ranks matches
+            queryset = queryset.filter(
+                Q(user__username__trigram_word_similar=search)
+                | Q(user__first_name__trigram_word_similar=search)
+                | Q(user__last_name__trigram_word_similar=search)
+            ).annotate(
+                similarity=Cast(
+                    Greatest(
+                        TrigramWordSimilarity(search, "user__username"),
+                        TrigramWordSimilarity(search, "user__first_name"),
+                        TrigramWordSimilarity(search, "user__last_name"),
+                    ),
+                    FloatField(),
+                )
+            )
+            self.keyset_ordering = ("-similarity", "-id")
+
         if joined:
             try:
                 start, end = joined.split(",")
@@ -182,9 +339,10 @@ class FollowViewSet(
 ):
     """endpoint for working with follow data."""
 
-    queryset = Follow.objects.all()
+    queryset = Follow.objects.select_related("follower", "followee")
     serializer_class = FollowSerializer
     permission_classes = (IsOwnerOrAuthenticatedReadOnly,)
+    throttle_scopes = {"create": "follows", "destroy": "follows"}
 
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
@@ -196,6 +354,41 @@ class FollowViewSet(
     def get_queryset(self):
         return self.queryset.filter(follower_id=self.request.user.id)
 
+    def perform_create(self, serializer):
+        """Follow user and backfill followee posts into my timeline"""
+        with transaction.atomic():
+            follow = serializer.save()
+            get_user_model().objects.filter(pk=follow.followee_id).update(
+                followers_count=F("followers_count") + 1
+            )
+            get_user_model().objects.filter(pk=follow.follower_id).update(
+                following_count=F("following_count") + 1
+            )
+            timeline.backfill(follow.follower_id, follow.followee_id)
+            graph.add_follow(follow)
+
+    def perform_destroy(self, instance):
+        """Unfollow user and prune followee posts from my timeline"""
+        with transaction.atomic():
+            timeline.prune(instance.follower_id, instance.followee_id)
+            followee = get_user_model().objects.filter(pk=instance.followee_id)
+            followee.update(followers_count=F("followers_count") - 1)
+            # the row stays locked, concurrent unfollows see other counts
+            followers_count = followee.values_list(
+                "followers_count", flat=True
+            ).get()
+            if timeline.is_pulled(followers_count + 1) and not (
+                timeline.is_pulled(followers_count)
+            ):
+                transaction.on_commit(
+                    partial(fan_out_author.delay, instance.followee_id)
+                )
+            get_user_model().objects.filter(pk=instance.follower_id).update(
+                following_count=F("following_count") - 1
+            )
+            graph.remove_follow(instance)
+            instance.delete()
+
 
 class FollowersViewSet(
     mixins.ListModelMixin,
@@ -203,50 +396,153 @@ class FollowersViewSet(
 ):
     """endpoint for working with followers data."""
 
-    queryset = Follow.objects.all()
+    queryset = Follow.objects.select_related("follower")
     serializer_class = FollowersSerializer
 
     def get_queryset(self):
         return self.queryset.filter(followee_id=self.request.user.id)
 
 
-class MyFollowingSet(
-    mixins.ListModelMixin,
-    viewsets.GenericViewSet,
-):
+class FollowPageMixin:
+    """Cursor paginated users on one side of follows, newest follows first"""
+
+    def get_users_page(self, follows, user_field: str):
+        page = self.paginate_queryset(
+            follows.select_related(user_field).only(
+                "id",
+                "created_at",
+                *(
+                    f"{user_field}__{field}"
+                    for field in GraphUserSerializer.Meta.fields
+                ),
+            )
+        )
+        users = [getattr(follow, user_field) for follow in page]
+        return self.get_paginated_response(
+            GraphUserSerializer(users, many=True).data
+        )
+
+
+class MyFollowingSet(FollowPageMixin, viewsets.GenericViewSet):
     """endpoint for working with following data."""
 
-    serializer_class = MyFollowingSerializer
-    queryset = get_user_model().objects.all()
+    serializer_class = GraphUserSerializer
+    permission_classes = (IsAuthenticated,)
 
-    def get_queryset(self):
-        return self.queryset.filter(id=self.request.user.id)
+    def list(self, request, *args, **kwargs):
+        """Get users I follow"""
+        return self.get_users_page(
+            Follow.objects.filter(follower_id=request.user.id), "followee"
+        )
 
 
-class MyFollowersSet(
-    mixins.ListModelMixin,
-    viewsets.GenericViewSet,
-):
+class MyFollowersSet(FollowPageMixin, viewsets.GenericViewSet):
     """endpoint for working with my followers data."""
 
-    serializer_class = MyFollowersSerializer
-    queryset = get_user_model().objects.all()
+    serializer_class = GraphUserSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request, *args, **kwargs):
+        """Get users following me"""
+        return self.get_users_page(
+            Follow.objects.filter(followee_id=request.user.id), "follower"
+        )
+
+
+class UserGraphViewSet(
+    FollowPageMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """endpoint for follow counters and relations of users."""
+
+    queryset = get_user_model().objects.only(*GraphUserSerializer.Meta.fields)
+    serializer_class = GraphUserDetailSerializer
+    permission_classes = (IsAuthenticated,)
+    mutuals_limit = 20
+    max_mutuals_limit = 100
+
+    def get_serializer_class(self):
+        if self.action in ("followers", "following", "mutuals"):
+            return GraphUserSerializer
+        return self.serializer_class
+
+    @action(detail=True, methods=["GET"])
+    def followers(self, request, *args, **kwargs):
+        """Get users following this user"""
+        user = self.get_object()
+        return self.get_users_page(
+            Follow.objects.filter(followee_id=user.id), "follower"
+        )
+
+    @action(detail=True, methods=["GET"])
+    def following(self, request, *args, **kwargs):
+        """Get users this user follows"""
+        user = self.get_object()
+        return self.get_users_page(
+            Follow.objects.filter(follower_id=user.id), "followee"
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="Number of users, at most 100 (ex. ?limit=20)",
+            ),
+        ],
+    )
+    @action(detail=True, methods=["GET"], pagination_class=None)
+    def mutuals(self, request, *args, **kwargs):
+        """Get users following both me and this user"""
+        user = self.get_object()
+        try:
+            limit = int(request.query_params.get("limit", self.mutuals_limit))
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+        limit = min(max(limit, 1), self.max_mutuals_limit)
+        user_ids = graph.mutual_followers(request.user.id, user.id, limit)
+        users = self.get_queryset().in_bulk(user_ids)
+        serializer = self.get_serializer(
+            [users[pk] for pk in user_ids if pk in users], many=True
+        )
+        return Response(serializer.data)
+
+
+class FollowSuggestionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """endpoint for users suggested to follow."""
+
+    queryset = FollowSuggestion.objects.select_related("suggested")
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = (IsAuthenticated,)
+    keyset_ordering = ("-score", "-id")
 
     def get_queryset(self):
-        return self.queryset.filter(id=self.request.user.id)
+        """Suggestions of the request user not followed since computed"""
+        user = self.request.user
+        return self.queryset.filter(user=user).exclude(
+            Exists(
+                Follow.objects.filter(
+                    follower=user, followee_id=OuterRef("suggested_id")
+                )
+            )
+        )
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """endpoint for working with post data."""
 
-    queryset = (
-        Post.objects.all()
-        .filter(is_published=True)
-        .select_related("author")
-        .prefetch_related("hashtags", "images")
+    queryset = Post.published.select_related("author").prefetch_related(
+        "hashtags", "images"
     )
     serializer_class = AllPostsListSerializer
     permission_classes = (IsOwnerOrAuthenticatedReadOnly,)
+    throttle_scopes = {
+        "create": "posts",
+        "bulk": "posts",
+        "update": "posts",
+        "partial_update": "posts",
+        "like": "likes",
+        "upload_image": "uploads",
+    }
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -255,6 +551,8 @@ class PostViewSet(viewsets.ModelViewSet):
             return ImageCreateSerializer
         elif self.action == "like":
             return LikePostExtraActionSerializer
+        elif self.action == "bulk":
+            return PostBulkSerializer
         return self.serializer_class
 
     @extend_schema(
@@ -272,45 +570,142 @@ class PostViewSet(viewsets.ModelViewSet):
             OpenApiParameter(
                 "content",
                 type=OpenApiTypes.STR,
-                description="Filter by piece of content"
-                "(ex. ?content=some text from content)",
+                description="Full-text search in content, results are "
+                "ranked by relevance (ex. ?content=some text from content)",
             ),
         ]
     )
     def list(self, request, *args, **kwargs):
         """Get list of posts"""
-        return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.get_payloads_response(page)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get post"""
+        post = self.get_object()
+        return self.get_conditional_response(
+            [post],
+            lambda: Response(self.get_payloads([post])[0]),
+            extra=likes.pending([post.id]),
+        )
+
+    def get_payloads(self, posts, queryset=None) -> list:
+        """Serialize posts using the payload cache, posts missing in it
+        are loaded from `queryset` (published posts by default)"""
+        if queryset is None:
+            queryset = self.queryset
+        return payloads.post_payloads(posts, queryset, self.request)
+
+    def get_payloads_response(self, posts, queryset=None):
+        """Return a page of serialized posts or 304 if it is not modified"""
+        return self.get_conditional_response(
+            posts,
+            lambda: self.get_paginated_response(
+                self.get_payloads(posts, queryset)
+            ),
+            extra=likes.pending([post.id for post in posts]),
+            many=True,
+        )
 
     def get_queryset(self):
         queryset = self.queryset
-        tags = self.request.query_params.get("tags")
-        author = self.request.query_params.get("author")
-        content = self.request.query_params.get("content")
+        if self.action in ("list", "retrieve"):
+            # payloads come from the cache, rows only carry counters
+            queryset = queryset.select_related(None).prefetch_related(None)
+        queryset, ordering = self.filter_posts(
+            queryset, self.request.query_params
+        )
+        if ordering is not None:
+            self.keyset_ordering = ordering
+        return queryset
+
+    @staticmethod
+    def filter_posts(queryset, params) -> tuple:
+        """Apply the list filters of query params, return the queryset and
+        its keyset ordering if it differs from the default one."""
+        ordering = None
+        tags = params.get("tags")
+        author = params.get("author")
+        content = params.get("content")
         if tags:
-            tags = tags.split(",")
+            tags = [Hashtag.normalize(tag) for tag in tags.split(",")]
             queryset = queryset.filter(hashtags__text__in=tags)
         if author:
             queryset = queryset.filter(author__username__icontains=author)
         if content:
-            queryset = queryset.filter(content__icontains=content)
+            query = SearchQuery(
+                content, search_type="websearch", config=settings.SEARCH_CONFIG
+            )
+            # rank is cast to double precision to survive the cursor exactly
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+            )
+            ordering = ("-rank", "-id")
 
-        return queryset.distinct()
+        return queryset.distinct(), ordering
 
     @action(detail=False, methods=["GET"])
     def my_posts(self, request, *args, **kwargs):
         """Get list of my posts"""
         posts = Post.objects.all().filter(author_id=self.request.user.id)
-        serialiser = self.get_serializer(posts, many=True)
-        return Response(serialiser.data, status=status.HTTP_200_OK)
+        page = self.paginate_queryset(posts)
+        # scheduled and unpublished posts are listed to their author
+        return self.get_payloads_response(
+            page,
+            Post.objects.select_related("author").prefetch_related(
+                "hashtags", "images"
+            ),
+        )
 
     @action(detail=False, methods=["GET"])
     def my_following(self, request, *args, **kwargs):
-        """Get list of my following"""
-        posts = Post.objects.all().filter(
-            author__in=self.request.user.following.all()
+        """Get posts of my following from my precomputed timeline"""
+        items = self.paginator.paginate_source(
+            partial(timeline.read, self.request.user.id), request, view=self
+        )
+        posts = timeline.load_posts(
+            [item.id for item in items],
+            self.queryset.select_related(None).prefetch_related(None),
+        )
+        return self.get_payloads_response(posts)
+
+    @extend_schema(
+        request=PostBulkSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                "Response",
+                value={"created": [1, 2], "errors": {"2": {"content": []}}},
+                response_only=True,
+            ),
+        ],
+    )
+    @action(
+        detail=False, methods=["post"], permission_classes=(IsAuthenticated,)
+    )
+    def bulk(self, request, *args, **kwargs):
+        """Create many posts at once, errors are reported by item index"""
+        if not isinstance(request.data, list):
+            raise ValidationError({"detail": "Expected a list of posts."})
+        if len(request.data) > settings.POST_BULK_MAX_SIZE:
+            raise ValidationError(
+                {
+                    "detail": f"Ensure there are at most "
+                    f"{settings.POST_BULK_MAX_SIZE} posts."
+                }
+            )
+        posts, errors = ingest.create_posts(
+            [(request.user.id, data) for data in request.data]
+        )
+        return Response(
+            {"created": [post.id for post in posts], "errors": errors},
+            status=(
+                status.HTTP_201_CREATED
+                if posts or not errors
+                else status.HTTP_400_BAD_REQUEST
+            ),
         )
-        serialiser = self.get_serializer(posts, many=True)
-        return Response(serialiser.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"])
     def upload_image(self, request, *args, **kwargs):
@@ -324,17 +719,24 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=True, methods=["post"])
+    @action(
+        detail=True, methods=["post"], permission_classes=(IsAuthenticated,)
+    )
     def like(self, request, *args, **kwargs):
-        """Create like for current post"""
+        """Like or unlike current post"""
         post = self.get_object()
+        like = Like.objects.filter(post=post, reviewer=request.user).first()
         serializer = self.get_serializer(
+            like,
             data=request.data,
             context={"request": request, "post": post},  # як це працює
         )
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(
+                serializer.data,
+                status=status.HTTP_200_OK if like else status.HTTP_201_CREATED,
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False)
@@ -342,9 +744,211 @@ class PostViewSet(viewsets.ModelViewSet):
         """Get posts that you liked"""
         queryset = self.queryset.filter(
             likes__reviewer=self.request.user.id, likes__is_likes=True
-        ).prefetch_related("likes__reviewer")
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        ).prefetch_related(None)
+        page = self.paginate_queryset(queryset)
+        return self.get_payloads_response(page)
+
+
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """endpoint for resumable chunked uploads of post images."""
+
+    serializer_class = UploadSerializer
+    permission_classes = (IsAuthenticated,)
+    throttle_scopes = {
+        "create": "uploads",
+        "chunk": "upload_chunks",
+        "finalize": "uploads",
+    }
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+        instance.delete()
+
+    @extend_schema(
+        request={"application/offset+octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                "Upload-Offset",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.HEADER,
+                required=True,
+                description="Position of the chunk in the file, must be "
+                "equal to the current offset of the upload",
+            ),
+        ],
+    )
+    @action(detail=True, methods=["put"])
+    def chunk(self, request, *args, **kwargs):
+        """Write the request body at the upload offset, responds 409 with
+        the current offset if the chunk is not the next one"""
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {"Upload-Offset": "The header must be set to an integer."}
+            )
+        if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+            raise ValidationError(
+                {
+                    "Content-Length": f"Ensure the chunk is at most "
+                    f"{settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes."
+                }
+            )
+        upload = self.get_object()
+        if offset != upload.offset:
+            return self.get_offset_conflict_response(upload)
+        if offset + length > upload.size:
+            raise ValidationError(
+                {"Content-Length": "The chunk exceeds the file size."}
+            )
+        if length:
+            # the body is received without holding a lock, the offset only
+            # advances if no other chunk was written at it meanwhile
+            chunk = uploads.receive_chunk(upload, request.stream, length)
+            try:
+                with transaction.atomic():
+                    advanced = (
+                        self.get_queryset()
+                        .filter(pk=upload.pk, offset=offset)
+                        .update(
+                            offset=offset + chunk.stat().st_size,
+                            updated_at=Now(),
+                        )
+                    )
+                    if advanced:
+                        uploads.append_chunk(upload, chunk, offset)
+            finally:
+                chunk.unlink(missing_ok=True)
+            upload = self.get_object()
+            if not advanced:
+                return self.get_offset_conflict_response(upload)
+        return Response(
+            self.get_serializer(upload).data,
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    @staticmethod
+    def get_offset_conflict_response(upload):
+        return Response(
+            {"offset": upload.offset},
+            status=status.HTTP_409_CONFLICT,
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    @extend_schema(request=None, responses=ImageCreateSerializer)
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, *args, **kwargs):
+        """Attach the uploaded file to the post and queue its processing"""
+        upload = self.get_object()
+        if not upload.is_complete:
+            raise ValidationError(
+                {
+                    "offset": f"Only {upload.offset} of {upload.size} bytes "
+                    f"have been uploaded."
+                }
+            )
+        try:
+            image = uploads.finalize(upload)
+        except Upload.DoesNotExist:
+            raise NotFound()
+        except ValueError as exc:
+            self.perform_destroy(upload)
+            raise ValidationError({"filename": str(exc)})
+        serializer = ImageCreateSerializer(
+            image, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class HashtagViewSet(viewsets.GenericViewSet):
+    """endpoint for hashtag statistics."""
+
+    queryset = Hashtag.objects.all()
+    serializer_class = HashtagUsesSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = None
+    default_limit = 10
+    max_limit = 100
+
+    def get_limit(self) -> int:
+        try:
+            limit = int(
+                self.request.query_params.get("limit", self.default_limit)
+            )
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+        return min(max(limit, 1), self.max_limit)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "window",
+                type=OpenApiTypes.STR,
+                enum=list(trending.WINDOWS),
+                description="Time window (ex. ?window=24h), default 24h",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="Number of hashtags, at most 100 (ex. ?limit=10)",
+            ),
+        ],
+    )
+    @action(detail=False, methods=["GET"])
+    def trending(self, request, *args, **kwargs):
+        """Get the most used hashtags of the last hour, day or week"""
+        window = request.query_params.get("window", "24h")
+        if window not in trending.WINDOWS:
+            raise ValidationError(
+                {"window": f"Choose one of {', '.join(trending.WINDOWS)}."}
+            )
+        top = trending.top(window, self.get_limit())
+        hashtags = self.get_queryset().in_bulk([pk for pk, _ in top])
+        serializer = self.get_serializer(
+            [
+                {"text": hashtags[pk].text, "uses": uses}
+                for pk, uses in top
+                if pk in hashtags
+            ],
+            many=True,
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="Beginning of the hashtag (ex. ?q=dja)",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="Number of hashtags, at most 100 (ex. ?limit=10)",
+            ),
+        ],
+    )
+    @action(detail=False, methods=["GET"])
+    def autocomplete(self, request, *args, **kwargs):
+        """Get the most used hashtags starting with the given prefix"""
+        suggestions = autocomplete.suggest(
+            request.query_params.get("q", ""), self.get_limit()
+        )
+        serializer = self.get_serializer(
+            [{"text": text, "uses": uses} for text, uses in suggestions],
+            many=True,
+        )
+        return Response(serializer.data)
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -353,6 +957,11 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentListSerializer
     permission_classes = (IsOwnerOrAuthenticatedReadOnly,)
+    throttle_scopes = {
+        "create": "comments",
+        "update": "comments",
+        "partial_update": "comments",
+    }
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -361,6 +970,12 @@ class CommentViewSet(viewsets.ModelViewSet):
             return CommentUpdateSerializer
         return self.serializer_class
 
+    def perform_destroy(self, instance):
+        """Delete comment and decrement comment counter of the post"""
+        with transaction.atomic():
+            Post.update_counters(instance.post_id, comments=-1)
+            instance.delete()
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -371,7 +986,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             OpenApiParameter(
                 "reviewer_id",
                 type=OpenApiTypes.INT,
-                description="Filter by reviewer id (ex. ?reviewer=2)",
+                description="Filter by reviewer id (ex. ?reviewer_id=2)",
             ),
             OpenApiParameter(
                 "reviewer",
@@ -388,14 +1003,14 @@ class CommentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = self.queryset
         post = self.request.query_params.get("post")
-        reviwer_id = self.request.query_params.get("reviwer_id")
-        reviwer = self.request.query_params.get("reviwer")
+        reviewer_id = self.request.query_params.get("reviewer_id")
+        reviewer = self.request.query_params.get("reviewer")
         if post:
             queryset = queryset.filter(post_id=int(post))
-        if reviwer_id:
-            queryset = queryset.filter(reviwer_id=int(reviwer_id))
-        if reviwer:
-            queryset = queryset.filter(reviewer__username__icontains=reviwer)
+        if reviewer_id:
+            queryset = queryset.filter(reviewer_id=int(reviewer_id))
+        if reviewer:
+            queryset = queryset.filter(reviewer__username__icontains=reviewer)
         return queryset
 
 
@@ -405,6 +1020,11 @@ class LikeViewSet(viewsets.ModelViewSet):
     queryset = Like.objects.all()
     serializer_class = LikeListSerializer
     permission_classes = (IsOwnerOrAuthenticatedReadOnly,)
+    throttle_scopes = {
+        "create": "likes",
+        "update": "likes",
+        "partial_update": "likes",
+    }
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -412,3 +1032,17 @@ class LikeViewSet(viewsets.ModelViewSet):
         if self.action in ("update", "partial_update"):
             return LikeUpdateSerializer
         return self.serializer_class
+
+    def perform_destroy(self, instance):
+        """Delete like and decrement like counter of the post"""
+        with transaction.atomic():
+            is_likes = (
+                Like.objects.select_for_update()
+                .filter(pk=instance.pk)
+                .values_list("is_likes", flat=True)
+                .first()
+            )
+            if is_likes is None:
+                return
+            likes.record(instance.post_id, -int(is_likes))
+            instance.delete()
@@ -6,8 +6,5 @@ python manage.py wait_for_db
 echo "Applying migrations..."
 python manage.py migrate
 
-echo "Starting Celery worker..."
-celery -A api_config worker --loglevel=INFO --pool=solo &
-
-echo "Starting Django server..."
-exec python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+echo "Starting gunicorn..."
+exec gunicorn --config api_config/gunicorn.conf.py